@@ -0,0 +1,83 @@
+import math
+from datetime import datetime, timezone
+
+# ********************* AGREGADOS POR MINUTO / HORA / DIA *********************************
+# Acumuladores de contagem, soma, mínimo, máximo e soma dos quadrados de cada medida,
+# calculados em memória para um lote de leituras e depois somados às tabelas de agregados.
+
+NIVEIS = {"minuto": 60, "hora": 3600, "dia": 86400}
+# Nome do nível -> tamanho do intervalo em segundos.
+
+CASAS_DECIMAIS = 2
+# Mesma escala das colunas Numeric(10, 2) de registro, para que os agregados batam com os dados gravados.
+
+
+def epoch(tempo):
+    # Datas sem fuso horário são tratadas como UTC
+    if tempo.tzinfo is None:
+        tempo = tempo.replace(tzinfo=timezone.utc)
+    return tempo.timestamp()
+
+
+def novo_acumulador(campos):
+    acumulador = {"contagem": 0}
+    for campo in campos:
+        acumulador[campo + "_n"] = 0
+        acumulador[campo + "_soma"] = 0.0
+        acumulador[campo + "_min"] = None
+        acumulador[campo + "_max"] = None
+        acumulador[campo + "_soma2"] = 0.0
+    return acumulador
+
+
+def acumula(acumulador, linha, campos):
+    acumulador["contagem"] += 1
+    for campo in campos:
+        valor = linha.get(campo)
+        if valor is None:
+            continue
+        valor = round(float(valor), CASAS_DECIMAIS)
+        acumulador[campo + "_n"] += 1
+        acumulador[campo + "_soma"] += valor
+        acumulador[campo + "_soma2"] += valor * valor
+        minimo = acumulador[campo + "_min"]
+        if minimo is None or valor < minimo:
+            acumulador[campo + "_min"] = valor
+        maximo = acumulador[campo + "_max"]
+        if maximo is None or valor > maximo:
+            acumulador[campo + "_max"] = valor
+
+
+def agrega(linhas, campos, niveis=NIVEIS):
+    # Agrupa as linhas (dicionários com tempo_registro e dispositivo) por nível, intervalo e dispositivo.
+    # Devolve {nivel: [linha da tabela de agregados, ...]}, com "balde" = início do intervalo.
+    por_nivel = {nivel: {} for nivel in niveis}
+    for linha in linhas:
+        tempo = linha.get("tempo_registro")
+        if tempo is None:
+            continue
+        segundos = int(epoch(tempo))
+        dispositivo = linha.get("dispositivo") or ""
+        for nivel, tamanho in niveis.items():
+            chave = (segundos - segundos % tamanho, dispositivo)
+            acumulador = por_nivel[nivel].get(chave)
+            if acumulador is None:
+                acumulador = por_nivel[nivel][chave] = novo_acumulador(campos)
+            acumula(acumulador, linha, campos)
+
+    resultado = {}
+    for nivel, baldes in por_nivel.items():
+        resultado[nivel] = [
+            dict(acumulador, balde=datetime.fromtimestamp(balde, tz=timezone.utc), dispositivo=dispositivo)
+            for (balde, dispositivo), acumulador in baldes.items()
+        ]
+    return resultado
+
+
+def estatisticas(n, soma, soma2, minimo, maximo):
+    # Média, desvio padrão (populacional), mínimo e máximo a partir dos acumuladores
+    if not n:
+        return {"n": 0, "media": None, "desvio": None, "min": None, "max": None}
+    media = soma / n
+    variancia = max(0.0, soma2 / n - media * media)
+    return {"n": n, "media": media, "desvio": math.sqrt(variancia), "min": minimo, "max": maximo}
@@ -0,0 +1,48 @@
+import numpy as np
+
+# ********************* REDUÇÃO DE PONTOS (DOWNSAMPLING) *********************************
+# Funções usadas por GET /registro/range para devolver no máximo `max_points` pontos
+# representativos de um intervalo de tempo, em vez de todas as leituras.
+
+
+def largura_intervalo(inicio, fim, max_pontos):
+    # Largura (em segundos, inteira) de cada intervalo para que caibam no máximo max_pontos intervalos
+    duracao = max(1, int(fim - inicio))
+    return max(1, -(-duracao // max_pontos))
+
+
+def lttb(x, y, n):
+    # Largest-Triangle-Three-Buckets: escolhe n índices de (x, y) preservando a forma visual da série.
+    # x deve estar em ordem crescente. Devolve um array de índices em ordem crescente.
+    tamanho = len(x)
+    if n >= tamanho or n < 3:
+        return np.arange(tamanho)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    indices = np.empty(n, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = tamanho - 1
+
+    # Os pontos do meio (sem o primeiro e o último) são divididos em n - 2 grupos
+    limites = np.linspace(1, tamanho - 1, n - 1).astype(np.int64)
+    anterior = 0
+    for i in range(n - 2):
+        inicio, fim = limites[i], limites[i + 1]
+
+        # Média do próximo grupo (ou o último ponto, no último grupo)
+        if i + 2 < len(limites):
+            prox_inicio, prox_fim = limites[i + 1], limites[i + 2]
+            media_x = x[prox_inicio:prox_fim].mean()
+            media_y = y[prox_inicio:prox_fim].mean()
+        else:
+            media_x = x[-1]
+            media_y = y[-1]
+
+        # Escolhe o ponto do grupo que forma o maior triângulo com o ponto anterior e a média seguinte
+        ax, ay = x[anterior], y[anterior]
+        areas = np.abs((ax - media_x) * (y[inicio:fim] - ay) - (ax - x[inicio:fim]) * (media_y - ay))
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+
+    return indices
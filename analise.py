@@ -0,0 +1,257 @@
+import math
+import threading
+from collections import deque
+
+# ********************* ANÁLISE CONTÍNUA NA INGESTÃO *********************************
+# Estatísticas de janela deslizante (média, variância, mínimo e máximo) por dispositivo e
+# medida, atualizadas a cada leitura em O(1) amortizado, e regras de alerta avaliadas na
+# mesma hora. Substitui recarregar a tabela inteira no pandas para saber, por exemplo, se o
+# CO2 está acima de 1000 ppm há 5 minutos.
+#
+# Média e variância vêm de somas acumuladas (somadas na entrada, subtraídas na saída da janela);
+# mínimo e máximo vêm de filas monotônicas, em que cada leitura entra e sai uma única vez.
+
+TIPOS_REGRA = ["limite", "zscore"]
+# limite: {"medida": "co2", "acima": 1000, "duracao_s": 300} (ou "abaixo"); dispara quando a
+#         condição vale continuamente por duracao_s (0 = na primeira leitura)
+# zscore: {"medida": "temperatura", "janela_s": 300, "limite": 3.0, "min_amostras": 30}; dispara
+#         quando a leitura se afasta mais de `limite` desvios da média da janela (sem contar ela mesma)
+# Campos opcionais de toda regra: "nome", "dispositivo" (só esse dispositivo), "duracao_s".
+
+
+class JanelaMovel:
+
+    def __init__(self, duracao_s):
+        self.duracao = duracao_s
+        self._valores = deque()   # (t, valor) em ordem de chegada
+        self._minimos = deque()   # candidatos a mínimo: valores crescentes
+        self._maximos = deque()   # candidatos a máximo: valores decrescentes
+        self._referencia = None
+        self._soma = 0.0
+        self._soma_quadrados = 0.0
+        # As somas são de (valor - referencia), com a referência sendo o primeiro valor da janela:
+        # evita o cancelamento numérico de soma_quadrados - soma²/n quando a variância é pequena
+        # perto da média (por exemplo, pressão em torno de 1013 hPa).
+
+    def adiciona(self, t, valor):
+        if self._referencia is None:
+            self._referencia = valor
+        desvio = valor - self._referencia
+        self._valores.append((t, valor))
+        self._soma += desvio
+        self._soma_quadrados += desvio * desvio
+        while self._minimos and self._minimos[-1][1] >= valor:
+            self._minimos.pop()
+        self._minimos.append((t, valor))
+        while self._maximos and self._maximos[-1][1] <= valor:
+            self._maximos.pop()
+        self._maximos.append((t, valor))
+        self.expira(t)
+
+    def expira(self, agora):
+        limite = agora - self.duracao
+        while self._valores and self._valores[0][0] <= limite:
+            desvio = self._valores.popleft()[1] - self._referencia
+            self._soma -= desvio
+            self._soma_quadrados -= desvio * desvio
+        while self._minimos and self._minimos[0][0] <= limite:
+            self._minimos.popleft()
+        while self._maximos and self._maximos[0][0] <= limite:
+            self._maximos.popleft()
+        if not self._valores:
+            # Janela vazia: recomeça as somas do zero (descarta o erro de arredondamento acumulado)
+            self._referencia = None
+            self._soma = 0.0
+            self._soma_quadrados = 0.0
+
+    @property
+    def quantidade(self):
+        return len(self._valores)
+
+    def media_desvio(self):
+        n = len(self._valores)
+        if not n:
+            return None, None
+        media = self._soma / n
+        variancia = max(0.0, self._soma_quadrados / n - media * media) * n / (n - 1) if n > 1 else 0.0
+        return self._referencia + media, math.sqrt(variancia)
+
+    def estatisticas(self):
+        n = len(self._valores)
+        if not n:
+            return {"n": 0, "media": None, "desvio": None, "minimo": None, "maximo": None}
+        media, desvio = self.media_desvio()
+        return {"n": n, "media": media, "desvio": desvio,
+                "minimo": self._minimos[0][1], "maximo": self._maximos[0][1],
+                "inicio": self._valores[0][0], "fim": self._valores[-1][0]}
+
+
+class _Serie:
+    # Janelas de uma medida de um dispositivo (ou de todos, no resumo geral)
+
+    def __init__(self, janelas):
+        self.janelas = {duracao: JanelaMovel(duracao) for duracao in janelas}
+        self.ultimo = None
+        self.valor = None
+
+    def adiciona(self, t, valor):
+        # Leituras fora de ordem entram como se tivessem chegado no último instante visto,
+        # para a janela continuar andando só para frente
+        if self.ultimo is not None and t < self.ultimo:
+            t = self.ultimo
+        self.ultimo = t
+        self.valor = valor
+        for janela in self.janelas.values():
+            janela.adiciona(t, valor)
+        return t
+
+
+def _valida_regra(indice, regra, medidas):
+    regra = dict(regra)
+    regra.setdefault("nome", f"regra{indice}")
+    if regra.get("tipo") not in TIPOS_REGRA:
+        raise ValueError(f"Regra {regra['nome']}: tipo deve ser um de {', '.join(TIPOS_REGRA)}")
+    if regra.get("medida") not in medidas:
+        raise ValueError(f"Regra {regra['nome']}: medida deve ser uma de {', '.join(medidas)}")
+    regra["duracao_s"] = float(regra.get("duracao_s", 0))
+    if regra["tipo"] == "limite":
+        if regra.get("acima") is None and regra.get("abaixo") is None:
+            raise ValueError(f"Regra {regra['nome']}: informe acima e/ou abaixo")
+    else:
+        regra["janela_s"] = int(regra.get("janela_s", 300))
+        regra["limite"] = float(regra.get("limite", 3.0))
+        regra["min_amostras"] = max(2, int(regra.get("min_amostras", 30)))
+    return regra
+
+
+class AnaliseStream:
+
+    def __init__(self, medidas, janelas_s=(60, 300, 3600), regras=(), max_alertas=1000):
+        self.medidas = list(medidas)
+        self.regras = [_valida_regra(i, regra, self.medidas) for i, regra in enumerate(regras)]
+        # As janelas das regras de z-score também são mantidas, mesmo que não estejam na configuração
+        self.janelas = sorted(set(int(j) for j in janelas_s) | {r["janela_s"] for r in self.regras if r["tipo"] == "zscore"})
+        self._series = {}         # (dispositivo, medida) -> _Serie; dispositivo None = todos
+        self._estados = {}        # (nome da regra, dispositivo) -> [início da condição, disparado]
+        self._alertas = deque(maxlen=max_alertas)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.leituras = 0
+
+    @property
+    def ultimo_seq(self):
+        return self._seq
+
+    def _serie(self, dispositivo, medida):
+        serie = self._series.get((dispositivo, medida))
+        if serie is None:
+            serie = self._series[(dispositivo, medida)] = _Serie(self.janelas)
+        return serie
+
+    def processa(self, linha):
+        # Chamado para cada leitura nova: atualiza as janelas e devolve os alertas que mudaram de estado
+        t = linha["tempo_registro"].timestamp()
+        dispositivo = linha.get("dispositivo") or ""
+        eventos = []
+        with self._lock:
+            self.leituras += 1
+            tempos = {}
+            for medida in self.medidas:
+                valor = linha.get(medida)
+                if valor is None:
+                    continue
+                valor = float(valor)
+                serie = self._serie(dispositivo, medida)
+                agora = t if serie.ultimo is None else max(t, serie.ultimo)
+                # z-score é avaliado contra a janela antes da leitura entrar nela
+                for regra in self.regras:
+                    if regra["tipo"] == "zscore" and regra["medida"] == medida and self._aplica(regra, dispositivo):
+                        janela = serie.janelas[regra["janela_s"]]
+                        janela.expira(agora)
+                        condicao, detalhe = self._zscore(regra, janela, valor)
+                        self._avalia(regra, dispositivo, agora, valor, condicao, detalhe, eventos)
+                tempos[medida] = serie.adiciona(t, valor)
+                self._serie(None, medida).adiciona(t, valor)
+            for regra in self.regras:
+                if regra["tipo"] == "limite" and regra["medida"] in tempos and self._aplica(regra, dispositivo):
+                    valor = float(linha[regra["medida"]])
+                    condicao = ((regra.get("acima") is not None and valor > regra["acima"]) or
+                                (regra.get("abaixo") is not None and valor < regra["abaixo"]))
+                    self._avalia(regra, dispositivo, tempos[regra["medida"]], valor, condicao, None, eventos)
+        return eventos
+
+    @staticmethod
+    def _aplica(regra, dispositivo):
+        return regra.get("dispositivo") is None or regra["dispositivo"] == dispositivo
+
+    @staticmethod
+    def _zscore(regra, janela, valor):
+        if janela.quantidade < regra["min_amostras"]:
+            return False, None
+        media, desvio = janela.media_desvio()
+        if not desvio:
+            return False, None
+        z = (valor - media) / desvio
+        return abs(z) > regra["limite"], {"z": round(z, 3), "media": media, "desvio": desvio}
+
+    def _avalia(self, regra, dispositivo, t, valor, condicao, detalhe, eventos):
+        # Cada regra tem um estado por dispositivo: dispara quando a condição se mantém por
+        # duracao_s e volta ao normal (um evento "normalizado") na primeira leitura sem ela
+        chave = (regra["nome"], dispositivo)
+        estado = self._estados.get(chave)
+        if not condicao:
+            if estado is not None:
+                del self._estados[chave]
+                if estado[1]:
+                    eventos.append(self._registra(regra, dispositivo, t, valor, "normalizado", detalhe))
+            return
+        if estado is None:
+            estado = self._estados[chave] = [t, False]
+        if not estado[1] and t - estado[0] >= regra["duracao_s"]:
+            estado[1] = True
+            eventos.append(self._registra(regra, dispositivo, t, valor, "disparado", dict(detalhe or {}, desde=estado[0])))
+
+    def _registra(self, regra, dispositivo, t, valor, estado, detalhe):
+        self._seq += 1
+        alerta = {"seq": self._seq, "regra": regra["nome"], "tipo": regra["tipo"], "medida": regra["medida"],
+                  "dispositivo": dispositivo or None, "estado": estado, "valor": valor, "tempo": t}
+        if detalhe:
+            alerta["detalhe"] = detalhe
+        self._alertas.append(alerta)
+        return alerta
+
+    def alertas(self, desde=0, dispositivos=None):
+        # Eventos com seq maior que `desde` e os alertas disparados no momento
+        with self._lock:
+            eventos = [alerta for alerta in self._alertas if alerta["seq"] > desde]
+            ativos = [{"regra": nome, "dispositivo": dispositivo or None, "desde": estado[0]}
+                      for (nome, dispositivo), estado in self._estados.items() if estado[1]]
+            seq = self._seq
+        if dispositivos is not None:
+            eventos = [alerta for alerta in eventos if alerta["dispositivo"] in dispositivos]
+            ativos = [alerta for alerta in ativos if alerta["dispositivo"] in dispositivos]
+        return seq, eventos, ativos
+
+    def estatisticas(self, dispositivos=None, medidas=None):
+        # {"geral": {medida: {janela: stats}}, "dispositivos": {dispositivo: {medida: {janela: stats}}}}
+        resultado = {"geral": {}, "dispositivos": {}}
+        with self._lock:
+            for (dispositivo, medida), serie in self._series.items():
+                if medidas is not None and medida not in medidas:
+                    continue
+                if dispositivo is None:
+                    destino = resultado["geral"]
+                elif dispositivos is None or (dispositivo or None) in dispositivos:
+                    destino = resultado["dispositivos"].setdefault(dispositivo, {})
+                else:
+                    continue
+                destino[medida] = {"ultimo": serie.valor, "tempo": serie.ultimo,
+                                   "janelas": {str(duracao): janela.estatisticas()
+                                               for duracao, janela in serie.janelas.items()}}
+        return resultado
+
+    def status(self):
+        with self._lock:
+            return {"leituras": self.leituras, "series": len(self._series), "janelas_s": self.janelas,
+                    "regras": len(self.regras), "alertas": self._seq,
+                    "ativos": sum(1 for estado in self._estados.values() if estado[1])}
@@ -0,0 +1,317 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# ********************* ARQUIVO HISTÓRICO EM PARQUET *********************************
+# Copia as leituras já gravadas em registro para arquivos Parquet (colunares, comprimidos e com
+# estatísticas de mínimo/máximo por grupo de linhas), um diretório por dia:
+#
+#   pasta/dia=2024-01-31/parte-000000001001-000000002000.parquet
+#
+# Leituras longas (dashboard, exportação, análises) leem só as colunas e os dias pedidos, com o
+# arquivo mapeado em memória, sem passar pelo banco. O banco continua sendo a fonte das leituras
+# recentes; o arquivo guarda até `ultimo_id` (ver arquiva). Leituras apagadas do banco por
+# DELETE /registro também são tiradas do arquivo (ver apaga).
+#
+# Quem lê o arquivo junto com o banco pega `ultimo_id` uma vez (estado()) e passa o mesmo valor
+# como `ate_id` nas leituras, para que arquivo e banco não entreguem a mesma leitura.
+
+ESQUEMA = pa.schema([
+    ("id", pa.int64()),
+    ("temperatura", pa.float64()),
+    ("pressao", pa.float64()),
+    ("altitude", pa.float64()),
+    ("umidade", pa.float64()),
+    ("co2", pa.float64()),
+    ("tempo_registro", pa.timestamp("us")),  # UTC, sem fuso (como no banco)
+    ("dispositivo", pa.string()),
+])
+PARTICOES = ds.partitioning(pa.schema([("dia", pa.string())]), flavor="hive")
+SEM_DATA = "sem_data"  # partição das leituras com tempo_registro nulo
+TENTATIVAS_LEITURA = 3  # um arquivo pode sumir entre a listagem e a leitura (junção de dias, apaga)
+_PARTE = re.compile(r"parte-(\d+)-(\d+)\.parquet$")
+
+
+def tabela(linhas):
+    # Tuplas na ordem de ESQUEMA (id, medidas..., tempo_registro, dispositivo) -> pyarrow.Table
+    colunas = list(zip(*linhas)) if linhas else [[] for _ in ESQUEMA]
+    return pa.table([pa.array(valores, type=campo.type) for campo, valores in zip(ESQUEMA, colunas)], schema=ESQUEMA)
+
+
+def _dia(segundos):
+    return datetime.fromtimestamp(segundos, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _data(segundos):
+    # Instante para comparar com a coluna tempo_registro (UTC sem fuso)
+    return datetime.fromtimestamp(segundos, tz=timezone.utc).replace(tzinfo=None)
+
+
+class ArquivoParquet:
+
+    def __init__(self, pasta, compressao="zstd", linhas_por_grupo=131072):
+        self.pasta = pasta
+        self.compressao = compressao
+        self.linhas_por_grupo = linhas_por_grupo
+        self._lock = threading.Lock()
+        self._sistema = fs.LocalFileSystem(use_mmap=True)
+        os.makedirs(pasta, exist_ok=True)
+
+    @contextmanager
+    def _exclusivo(self):
+        # Só um escritor por vez (arquiva, junta_dias, apaga), entre threads e entre processos:
+        # o ingestor arquiva enquanto um processo da API pode estar apagando
+        with self._lock, open(os.path.join(self.pasta, ".trava"), "a+") as trava:
+            if os.name == "nt":
+                import msvcrt
+                trava.seek(0)
+                msvcrt.locking(trava.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    trava.seek(0)
+                    msvcrt.locking(trava.fileno(), msvcrt.LK_UNLCK, 1)
+
+    # ---------- estado ----------
+
+    def _caminho_estado(self):
+        return os.path.join(self.pasta, "_estado.json")
+
+    def estado(self):
+        # ultimo_id: maior id já arquivado; marca: [maior id visto, epoch] da execução anterior
+        try:
+            with open(self._caminho_estado()) as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return {"ultimo_id": 0, "marca": None}
+
+    def _salva_estado(self, estado):
+        temporario = os.path.join(self.pasta, ".estado.tmp")
+        with open(temporario, "w") as arquivo:
+            json.dump(estado, arquivo)
+        os.replace(temporario, self._caminho_estado())
+
+    # ---------- gravação ----------
+
+    def _grava_arquivo(self, dados, caminho):
+        # Grava em um arquivo temporário (ignorado pelas leituras, começa com ".") e troca de uma vez
+        pasta = os.path.dirname(caminho)
+        os.makedirs(pasta, exist_ok=True)
+        temporario = os.path.join(pasta, "." + os.path.basename(caminho) + ".tmp")
+        pq.write_table(dados, temporario, compression=self.compressao, write_statistics=True,
+                       row_group_size=self.linhas_por_grupo, use_dictionary=["dispositivo"])
+        os.replace(temporario, caminho)
+
+    def grava(self, linhas):
+        # Divide as linhas por dia e grava um arquivo novo em cada partição; devolve a quantidade
+        dados = tabela(linhas)
+        if not dados.num_rows:
+            return 0
+        tempos = dados.column("tempo_registro").to_numpy(zero_copy_only=False).astype("datetime64[D]")
+        dias = np.where(np.isnat(tempos), SEM_DATA, np.datetime_as_string(tempos, unit="D"))
+        for dia in np.unique(dias).tolist():
+            parte = dados.filter(pa.array(dias == dia))
+            parte = parte.sort_by([("tempo_registro", "ascending"), ("id", "ascending")])
+            ids = parte.column("id").to_numpy()
+            nome = f"parte-{ids.min():012d}-{ids.max():012d}.parquet"
+            self._grava_arquivo(parte, os.path.join(self.pasta, f"dia={dia}", nome))
+        return dados.num_rows
+
+    def _partes(self):
+        # [(dia, caminho, primeiro id, último id)] de todos os arquivos do arquivo
+        partes = []
+        for caminho in glob.glob(os.path.join(self.pasta, "dia=*", "parte-*.parquet")):
+            encontrado = _PARTE.search(caminho)
+            if encontrado:
+                dia = os.path.basename(os.path.dirname(caminho))[len("dia="):]
+                partes.append((dia, caminho, int(encontrado.group(1)), int(encontrado.group(2))))
+        return partes
+
+    def arquiva(self, le_bloco, maior_id, atraso_s=60.0, bloco=100000, parar=None):
+        # Copia as leituras com id em (ultimo_id, limite] usando le_bloco(apos_id, ate_id, limite)
+        # -> lista de tuplas em ordem de id. O limite é o maior id visto na execução anterior, desde que
+        # ela tenha sido há pelo menos atraso_s: ids são reservados no INSERT, mas uma transação mais
+        # lenta pode confirmar um id menor depois de um maior, e esse id não pode ficar para trás.
+        with self._exclusivo():
+            estado = self.estado()
+            agora = time.time()
+            ultimo_id = estado["ultimo_id"]
+            # Arquivos de uma execução interrompida (ids além do último confirmado) são refeitos
+            for _, caminho, primeiro, _ in self._partes():
+                if primeiro > ultimo_id:
+                    os.remove(caminho)
+            marca = estado.get("marca")
+            if atraso_s <= 0:
+                limite = maior_id
+            elif marca is not None and agora - marca[1] >= atraso_s:
+                limite = marca[0]
+            else:
+                limite = ultimo_id
+            arquivadas = 0
+            while ultimo_id < limite and not (parar is not None and parar.is_set()):
+                linhas = le_bloco(ultimo_id, limite, bloco)
+                if not linhas:
+                    break
+                arquivadas += self.grava(linhas)
+                ultimo_id = linhas[-1][0]
+                estado["ultimo_id"] = ultimo_id
+                self._salva_estado(estado)
+            if marca is None or agora - marca[1] >= atraso_s or atraso_s <= 0:
+                estado["marca"] = [maior_id, agora]
+            self._salva_estado(estado)
+            juntados = self.junta_dias(_dia(agora))
+        return {"arquivadas": arquivadas, "ultimo_id": ultimo_id, "dias_juntados": juntados}
+
+    def junta_dias(self, antes_de):
+        # Junta em um arquivo só os vários arquivos de cada dia anterior a `antes_de` (AAAA-MM-DD).
+        # Um id repetido (de uma junção interrompida) aparece uma vez só no resultado.
+        por_dia = {}
+        for dia, caminho, _, _ in self._partes():
+            if dia < antes_de or dia == SEM_DATA:
+                por_dia.setdefault(dia, []).append(caminho)
+        juntados = 0
+        for dia, caminhos in por_dia.items():
+            if len(caminhos) < 2:
+                continue
+            dados = pa.concat_tables([pq.read_table(caminho, schema=ESQUEMA) for caminho in caminhos])
+            _, indices = np.unique(dados.column("id").to_numpy(), return_index=True)
+            dados = dados.take(pa.array(indices)).sort_by([("tempo_registro", "ascending"), ("id", "ascending")])
+            ids = dados.column("id").to_numpy()
+            destino = os.path.join(self.pasta, f"dia={dia}", f"parte-{ids.min():012d}-{ids.max():012d}.parquet")
+            self._grava_arquivo(dados, destino)
+            for caminho in caminhos:
+                if os.path.abspath(caminho) != os.path.abspath(destino):
+                    os.remove(caminho)
+            juntados += 1
+        return juntados
+
+    def apaga(self, ids=None, inicio=None, fim=None, dispositivos=None):
+        # Tira do arquivo as leituras apagadas no banco: as de `ids` ou as de [inicio, fim) (epoch) dos
+        # `dispositivos` (None = todos). Cada arquivo afetado é regravado no mesmo caminho (troca
+        # atômica) ou removido se ficar vazio. Devolve a quantidade de leituras removidas.
+        with self._exclusivo():
+            if ids is not None:
+                ids = sorted(set(int(i) for i in ids))
+                afetadas = [parte for parte in self._partes() if any(parte[2] <= i <= parte[3] for i in ids)]
+                condicao = ds.field("id").isin(ids)
+            else:
+                afetadas = [parte for parte in self._partes()
+                            if parte[0] != SEM_DATA and _dia(inicio) <= parte[0] <= _dia(fim)]
+                condicao = (ds.field("tempo_registro") >= _data(inicio)) & (ds.field("tempo_registro") < _data(fim))
+                if dispositivos:
+                    # is_valid: leituras sem dispositivo nunca entram no filtro (como no IN do banco)
+                    condicao &= ds.field("dispositivo").is_valid() & ds.field("dispositivo").isin(sorted(dispositivos))
+            removidas = 0
+            for _, caminho, _, _ in afetadas:
+                dados = pq.read_table(caminho, schema=ESQUEMA)
+                restantes = dados.filter(~condicao)
+                if restantes.num_rows == dados.num_rows:
+                    continue
+                removidas += dados.num_rows - restantes.num_rows
+                if restantes.num_rows:
+                    self._grava_arquivo(restantes, caminho)
+                else:
+                    os.remove(caminho)
+            return removidas
+
+    # ---------- leitura ----------
+
+    def dataset(self):
+        # Arquivos mapeados em memória; nomes começados por "." ou "_" (temporários, estado) são ignorados
+        return ds.dataset(self.pasta, schema=ESQUEMA.append(pa.field("dia", pa.string())), format="parquet",
+                          partitioning=PARTICOES,
+                          filesystem=self._sistema)
+
+    def _le(self, leitura):
+        # leitura(dataset) com o dataset descoberto de novo se um arquivo listado sumiu antes de ser lido
+        for tentativa in range(TENTATIVAS_LEITURA):
+            try:
+                return leitura(self.dataset())
+            except FileNotFoundError:
+                if tentativa == TENTATIVAS_LEITURA - 1:
+                    raise
+
+    @staticmethod
+    def _sem_repetidas(dados):
+        # Durante uma junção de dias o arquivo novo e os antigos coexistem por um instante: com as
+        # linhas já ordenadas por id (ou por tempo e id), as repetidas ficam lado a lado
+        if dados.num_rows < 2:
+            return dados
+        ids = dados.column("id").to_numpy()
+        unicas = np.concatenate([[True], ids[1:] != ids[:-1]])
+        return dados if unicas.all() else dados.filter(pa.array(unicas))
+
+    def filtro(self, inicio=None, fim=None, dispositivos=None, ate_id=None):
+        # inicio/fim em epoch (fim exclusivo). A condição sobre "dia" descarta diretórios inteiros;
+        # a sobre tempo_registro usa as estatísticas de cada grupo de linhas dos arquivos restantes.
+        condicoes = []
+        if inicio is not None:
+            condicoes += [ds.field("dia") >= _dia(inicio), ds.field("tempo_registro") >= _data(inicio)]
+        if fim is not None:
+            condicoes += [ds.field("dia") <= _dia(fim), ds.field("tempo_registro") < _data(fim)]
+        if dispositivos:
+            condicoes.append(ds.field("dispositivo").isin(sorted(dispositivos)))
+        if ate_id is not None:
+            condicoes.append(ds.field("id") <= ate_id)
+        filtro = None
+        for condicao in condicoes:
+            filtro = condicao if filtro is None else filtro & condicao
+        return filtro
+
+    def le(self, colunas=None, inicio=None, fim=None, dispositivos=None, ate_id=None):
+        # pyarrow.Table só com as colunas pedidas (dia fica de fora), em ordem de tempo_registro
+        colunas = list(colunas or ESQUEMA.names)
+        leitura = list(dict.fromkeys(colunas + ["id", "tempo_registro"]))
+        filtro = self.filtro(inicio, fim, dispositivos, ate_id)
+        dados = self._le(lambda dataset: dataset.to_table(columns=leitura, filter=filtro))
+        dados = self._sem_repetidas(dados.sort_by([("tempo_registro", "ascending"), ("id", "ascending")]))
+        return dados.select(colunas)
+
+    def ultimos(self, quantidade, colunas=None, ate_id=None):
+        # As `quantidade` leituras arquivadas mais recentes (por id, até ate_id): lê só os dias mais novos
+        # necessários, contando as linhas de cada dia pelos metadados dos arquivos
+        colunas = list(colunas or ESQUEMA.names)
+        return self._le(lambda dataset: self._ultimos(dataset, quantidade, colunas, ate_id))
+
+    def _ultimos(self, dataset, quantidade, colunas, ate_id):
+        por_dia = {}
+        for fragmento in dataset.get_fragments():
+            dia = ds.get_partition_keys(fragmento.partition_expression).get("dia")
+            por_dia.setdefault(dia, []).append(fragmento)
+        escolhidos = []
+        total = 0
+        for dia in sorted((dia for dia in por_dia if dia != SEM_DATA), reverse=True):
+            escolhidos.append(dia)
+            contagem = ds.field("id") <= ate_id if ate_id is not None else None
+            total += sum(fragmento.count_rows(filter=contagem) for fragmento in por_dia[dia])
+            if total >= quantidade:
+                break
+        if not escolhidos:
+            return pa.table({nome: pa.array([], type=ESQUEMA.field(nome).type) for nome in colunas})
+        filtro = ds.field("dia").isin(escolhidos)
+        if ate_id is not None:
+            filtro &= ds.field("id") <= ate_id
+        leitura = list(dict.fromkeys(colunas + ["id"]))
+        dados = self._sem_repetidas(dataset.to_table(columns=leitura, filter=filtro).sort_by("id"))
+        return dados.slice(max(0, dados.num_rows - quantidade)).select(colunas)
+
+    def status(self):
+        partes = self._partes()
+        estado = self.estado()
+        return {"pasta": os.path.abspath(self.pasta), "ultimo_id": estado["ultimo_id"], "marca": estado.get("marca"),
+                "arquivos": len(partes), "dias": len({parte[0] for parte in partes}),
+                "bytes": sum(os.path.getsize(parte[1]) for parte in partes)}
@@ -0,0 +1,563 @@
+# Benchmark offline da ingestão, da API e da carga de dados do dashboard.
+# Não precisa de MySQL nem de broker: usa bancos SQLite semeados com leituras sintéticas,
+# chama o callback do MQTT direto (como se fosse o ESP32) e faz as requisições pelo test client do Flask.
+#
+#   python benchmark.py                                        # 10k, 100k e 1M registros
+#   python benchmark.py --linhas 10000 --saida base.json       # só 10k, grava o resultado em base.json
+#   python benchmark.py --linhas 10000 --compara base.json     # compara com uma execução anterior
+#
+# Cada cenário roda em um subprocesso próprio, então o pico de memória (RSS) medido é só dele.
+# Os bancos semeados ficam em --pasta e são reaproveitados nas próximas execuções.
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import numpy as np
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+DISPOSITIVOS = 10  # ESP32 sintéticos; cada um mede uma vez por segundo
+INICIO = 1700000000  # epoch da primeira leitura sintética
+SEMENTE = 134  # mesma semente = mesmos dados em todas as execuções
+HISTORICO_MAX = 500000  # mesmo valor de dash.py (primeira carga do dashboard)
+BLOCO_SEMEADURA = 50000
+TOPICO = "projeto_integrado/SENAI134/Cienciadedados/esp{}"
+LEITURAS_POR_MENSAGEM_BINARIA = 10  # mqtt_binario: leituras de um mesmo dispositivo juntadas em cada payload
+
+CENARIOS_LEITURA = ["leitura", "completo", "paginado", "dash"]
+CENARIOS_ESCRITA = ["mqtt_spool", "mqtt_memoria", "mqtt_binario", "post"]
+# Os cenários de escrita rodam sobre uma cópia do banco semeado, para não alterar os de leitura.
+
+
+# ********************* MEDIDAS *********************************
+
+def pico_memoria_mb():
+    # Pico de memória residente do processo atual (ru_maxrss; no Windows, PeakWorkingSetSize)
+    try:
+        import resource
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+
+        class Contadores(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        contadores = Contadores()
+        contadores.cb = ctypes.sizeof(contadores)
+        processo = ctypes.windll.kernel32.GetCurrentProcess
+        processo.restype = wintypes.HANDLE
+        ctypes.windll.psapi.GetProcessMemoryInfo(processo(), ctypes.byref(contadores), contadores.cb)
+        return round(contadores.PeakWorkingSetSize / 1048576, 1)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / 1048576 if sys.platform == "darwin" else pico / 1024, 1)
+
+
+def percentis(tempos):
+    # tempos em segundos -> resumo em milissegundos
+    if not tempos:
+        return {"n": 0}
+    ms = np.array(tempos) * 1000
+    return {"n": len(tempos), "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3), "media_ms": round(float(ms.mean()), 3)}
+
+
+def cronometra(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+# ********************* DADOS SINTÉTICOS *********************************
+
+def leituras_sinteticas(primeira, quantidade):
+    # Leitura i: dispositivo i % DISPOSITIVOS, no segundo INICIO + i // DISPOSITIVOS (chave única garantida).
+    # Os valores dependem só de i, então as mesmas leituras saem iguais em qualquer execução.
+    indices = np.arange(primeira, primeira + quantidade)
+    gerador = np.random.default_rng(SEMENTE + primeira)
+    tempo = INICIO + indices // DISPOSITIVOS
+    dia = np.sin(2 * np.pi * (tempo % 86400) / 86400)
+    return {
+        "dispositivo": indices % DISPOSITIVOS,
+        "tempo": tempo,
+        "temperatura": np.round(25 + 5 * dia + gerador.normal(0, 0.5, quantidade), 2),
+        "pressao": np.round(1013 + gerador.normal(0, 3, quantidade), 2),
+        "altitude": np.round(900 + gerador.normal(0, 1, quantidade), 2),
+        "umidade": np.round(60 - 15 * dia + gerador.normal(0, 2, quantidade), 2),
+        "co2": np.round(420 + np.abs(gerador.normal(0, 60, quantidade)), 2),
+    }
+
+
+def linhas_registro(dados):
+    # Mesmo formato que converte_mqtt/converte_api entregam para insere_registros
+    return [
+        {"temperatura": t, "pressao": p, "altitude": a, "umidade": u, "co2": c,
+         "tempo_registro": datetime.fromtimestamp(tempo, tz=timezone.utc), "dispositivo": f"esp{d}"}
+        for t, p, a, u, c, tempo, d in zip(
+            dados["temperatura"].tolist(), dados["pressao"].tolist(), dados["altitude"].tolist(),
+            dados["umidade"].tolist(), dados["co2"].tolist(), dados["tempo"].tolist(), dados["dispositivo"].tolist())
+    ]
+
+
+def mensagens_mqtt(dados):
+    # Mensagens como o paho entrega ao on_message: tópico por dispositivo e payload JSON do ESP32
+    return [
+        SimpleNamespace(topic=TOPICO.format(d), payload=json.dumps({
+            "temperature": t, "pressure": p, "altitude": a, "humidity": u, "CO2": c, "timestamp": tempo
+        }).encode())
+        for t, p, a, u, c, tempo, d in zip(
+            dados["temperatura"].tolist(), dados["pressao"].tolist(), dados["altitude"].tolist(),
+            dados["umidade"].tolist(), dados["co2"].tolist(), dados["tempo"].tolist(), dados["dispositivo"].tolist())
+    ]
+
+
+def mensagens_mqtt_binarias(dados):
+    # As mesmas leituras no payload binário (payload_binario.py), em lotes por dispositivo
+    from payload_binario import codifica
+    campos = ["temperatura", "pressao", "altitude", "umidade", "co2"]
+    mensagens = []
+    for d in range(DISPOSITIVOS):
+        indices = np.flatnonzero(dados["dispositivo"] == d)
+        for inicio in range(0, len(indices), LEITURAS_POR_MENSAGEM_BINARIA):
+            parte = indices[inicio:inicio + LEITURAS_POR_MENSAGEM_BINARIA]
+            leituras = [dict(zip(["timestamp"] + campos, valores)) for valores in zip(
+                dados["tempo"][parte].tolist(), *(dados[campo][parte].tolist() for campo in campos))]
+            mensagens.append(SimpleNamespace(topic=TOPICO.format(d) + "/bin", payload=codifica(leituras)))
+    return mensagens
+
+
+# ********************* CENÁRIOS (rodam no subprocesso) *********************************
+
+def cenario_semeia(args):
+    import main
+    from sqlalchemy import insert
+    inicio = time.perf_counter()
+    with main.app.app_context():
+        main.atualiza_esquema()
+        for primeira in range(0, args.linhas, BLOCO_SEMEADURA):
+            quantidade = min(BLOCO_SEMEADURA, args.linhas - primeira)
+            # INSERT direto, sem os agregados: eles são recalculados de uma vez no final
+            main.mybd.session.execute(insert(main.Registro), linhas_registro(leituras_sinteticas(primeira, quantidade)))
+            main.mybd.session.commit()
+    return {"linhas": args.linhas, "insercao_s": round(time.perf_counter() - inicio, 3)}
+
+
+def cenario_mqtt(args):
+    import main
+    with main.app.app_context():
+        main.atualiza_esquema()
+    binario = args.cenario == "mqtt_binario"
+    mensagens = (mensagens_mqtt_binarias if binario else mensagens_mqtt)(leituras_sinteticas(args.linhas, args.mensagens))
+    fila = main.cria_fila_ingestao()
+    fila.iniciar()
+
+    tempos = []
+    inicio = time.perf_counter()
+    for mensagem in mensagens:
+        antes = time.perf_counter()
+        main.on_message(None, None, mensagem)
+        tempos.append(time.perf_counter() - antes)
+    publicacao = time.perf_counter() - inicio
+
+    # Espera até a fila (ou o spool) esvaziar e tudo que foi aceito estar gravado ou perdido
+    limite = time.monotonic() + args.timeout
+    while time.monotonic() < limite:
+        status = fila.status()
+        concluidos = status["gravados"] + status["falhas"] + status.get("rejeitados", 0)
+        if status["fila"] == 0 and concluidos >= status["recebidos"]:
+            break
+        time.sleep(0.05)
+    total = time.perf_counter() - inicio
+    status = fila.status()
+    fila.parar()
+    return {
+        "mensagens": len(mensagens),
+        "leituras_por_mensagem": LEITURAS_POR_MENSAGEM_BINARIA if binario else 1,
+        "callback_msgs_s": round(len(mensagens) / publicacao, 1),
+        "callback": percentis(tempos),
+        "gravadas_msgs_s": round(status["gravados"] / total, 1),
+        "gravados": status["gravados"],
+        "descartados": status["descartados"],
+        "falhas": status["falhas"],
+        "pico_rss_mb": pico_memoria_mb(),
+    }
+
+
+def cenario_post(args):
+    import main
+    with main.app.app_context():
+        main.atualiza_esquema()
+    cliente = main.app.test_client()
+    dados = leituras_sinteticas(args.linhas, args.repeticoes + args.lotes * 1000)
+    registros = [
+        {"temperatura": t, "pressao": p, "altitude": a, "umidade": u, "co2": c, "tempo_registro": tempo,
+         "dispositivo": f"api{d}"}
+        for t, p, a, u, c, tempo, d in zip(
+            dados["temperatura"].tolist(), dados["pressao"].tolist(), dados["altitude"].tolist(),
+            dados["umidade"].tolist(), dados["co2"].tolist(), dados["tempo"].tolist(), dados["dispositivo"].tolist())
+    ]
+    individuais, lotes = registros[:args.repeticoes], registros[args.repeticoes:]
+    corpos = ["\n".join(json.dumps(registro) for registro in lotes[i:i + 1000]) for i in range(0, len(lotes), 1000)]
+
+    codigos = set()
+
+    def posta(caminho, **kwargs):
+        codigos.add(cliente.post(caminho, **kwargs).status_code)
+
+    tempos_data = [cronometra(lambda: posta("/data", json=registro), 1)[0] for registro in individuais]
+    tempos_lote = [cronometra(lambda: posta("/data/batch", data=corpo, content_type="application/x-ndjson"), 1)[0]
+                   for corpo in corpos]
+    return {
+        "post_data": percentis(tempos_data),
+        "post_data_batch_1000": percentis(tempos_lote),
+        "batch_linhas_s": round(len(lotes) / sum(tempos_lote), 1) if tempos_lote else None,
+        "status_http": sorted(codigos),
+        "pico_rss_mb": pico_memoria_mb(),
+    }
+
+
+def rotas_leitura(linhas):
+    fim = INICIO + linhas // DISPOSITIVOS
+    meio = max(1, linhas // 2)
+    intervalo = f"start={INICIO}&end={fim}"
+    return {
+        "registro_pagina": "/registro?limit=1000",
+        "registro_pagina_meio": f"/registro?after_id={meio}&limit=1000",
+        "registro_pagina_colunar": f"/registro?after_id={meio}&limit=1000&layout=colunar",
+        "registro_dispositivo": f"/registro?dispositivo=esp3&after_id={meio}&limit=1000",
+        "registro_id": f"/registro/{meio}",
+        "range_bucket": f"/registro/range?{intervalo}",
+        "range_bucket_bruto": f"/registro/range?{intervalo}&fonte=bruto",
+        "range_lttb": f"/registro/range?{intervalo}&metodo=lttb&campo=temperatura",
+        "stats": "/registro/stats",
+        "stats_filtro": "/registro/stats?filters=temperatura:20:30",
+        "histogram": "/registro/histogram?x=umidade&y=temperatura&bins=30",
+        "agregados_hora": f"/registro/agregados?nivel=hora&{intervalo}",
+        "data_latest": "/data/latest",
+    }
+
+
+def cenario_leitura(args):
+    # Cada rota: "frio" invalida o cache antes de cada requisição (consulta ao banco),
+    # "cache" repete a mesma requisição já guardada no cache de respostas
+    import main
+    cliente = main.app.test_client()
+    resultado = {}
+    for nome, rota in rotas_leitura(args.linhas).items():
+        resposta = cliente.get(rota)
+        if resposta.status_code != 200:
+            resultado[nome] = {"erro": f"HTTP {resposta.status_code}"}
+            continue
+
+        def frio():
+            main.cache_respostas.invalida()
+            cliente.get(rota)
+
+        resultado[nome] = {
+            "bytes": len(resposta.data),
+            "frio": percentis(cronometra(frio, args.repeticoes)),
+            "cache": percentis(cronometra(lambda: cliente.get(rota), args.repeticoes)),
+        }
+    resultado["pico_rss_mb"] = pico_memoria_mb()
+    return resultado
+
+
+def cenario_completo(args):
+    # GET /registro sem parâmetros (a tabela inteira), consumindo a resposta em streaming
+    import main
+    cliente = main.app.test_client()
+    cliente.get("/registro/1")
+    base = pico_memoria_mb()
+    inicio = time.perf_counter()
+    resposta = cliente.get("/registro", buffered=False)
+    total = sum(len(parte) for parte in resposta.iter_encoded())
+    resposta.close()
+    return {"segundos": round(time.perf_counter() - inicio, 3), "bytes": total,
+            "rss_inicial_mb": base, "pico_rss_mb": pico_memoria_mb()}
+
+
+def cenario_paginado(args):
+    # A tabela inteira em páginas de REGISTRO_PAGINA_MAX com ?after_id=
+    import main
+    cliente = main.app.test_client()
+    cliente.get("/registro/1")
+    base = pico_memoria_mb()
+    limite = main.app.config["REGISTRO_PAGINA_MAX"]
+    paginas = 0
+    total = 0
+    tempos = []
+    after_id = 0
+    inicio = time.perf_counter()
+    while after_id is not None:
+        antes = time.perf_counter()
+        resposta = cliente.get(f"/registro?after_id={after_id}&limit={limite}")
+        tempos.append(time.perf_counter() - antes)
+        total += len(resposta.data)
+        paginas += 1
+        after_id = resposta.get_json()["proximo_id"]
+    return {"segundos": round(time.perf_counter() - inicio, 3), "paginas": paginas, "bytes": total,
+            "pagina": percentis(tempos), "rss_inicial_mb": base, "pico_rss_mb": pico_memoria_mb()}
+
+
+class _CursorSQLite:
+    # Cursor do sqlite3 que aceita os marcadores %s do mysql.connector usados em query.py
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), params)
+
+    def fetchmany(self, tamanho):
+        return self._cursor.fetchmany(tamanho)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _ConexaoSQLite:
+
+    def __init__(self, caminho):
+        self._conexao = sqlite3.connect(caminho)
+
+    def cursor(self):
+        return _CursorSQLite(self._conexao.cursor())
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conexao.close()
+
+
+class _PoolSQLite:
+    # No lugar do MySQLConnectionPool de query.py: mesma interface usada por query.conexao()
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def get_connection(self):
+        return _ConexaoSQLite(self.caminho)
+
+
+def cenario_dash(args):
+    # As mesmas consultas de dash.load_data: primeira carga (view_last_data) e atualização (view_new_data)
+    try:
+        import query
+    except ImportError as e:
+        return {"erro": f"query.py não pôde ser importado: {e}"}
+    query.get_pool = lambda: _PoolSQLite(args.banco)
+    inicio = time.perf_counter()
+    df = query.view_last_data(HISTORICO_MAX)
+    carga = time.perf_counter() - inicio
+    ultimo_id = int(df["id"].iloc[-1]) if len(df) else 0
+    atualizacoes = cronometra(lambda: query.view_new_data(max(0, ultimo_id - 1000)), args.repeticoes)
+    return {"linhas": len(df), "carga_inicial_s": round(carga, 3), "atualizacao_1000": percentis(atualizacoes),
+            "memoria_df_mb": round(df.memory_usage(deep=True).sum() / 1048576, 1), "pico_rss_mb": pico_memoria_mb()}
+
+
+CENARIOS = {
+    "semeia": cenario_semeia,
+    "mqtt_spool": cenario_mqtt,
+    "mqtt_memoria": cenario_mqtt,
+    "mqtt_binario": cenario_mqtt,
+    "post": cenario_post,
+    "leitura": cenario_leitura,
+    "completo": cenario_completo,
+    "paginado": cenario_paginado,
+    "dash": cenario_dash,
+}
+
+
+def executa_cenario(args):
+    # Modo subprocesso: silencia os prints e o log de SQL da aplicação (saída padrão) e grava o resultado em JSON
+    sys.path.insert(0, PASTA_PROJETO)
+    nulo = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(nulo, 1)
+    resultado = CENARIOS[args.cenario](args)
+    with open(args.resultado, "w") as arquivo:
+        json.dump(resultado, arquivo)
+
+
+# ********************* ORQUESTRAÇÃO *********************************
+
+def roda(cenario, banco, args, spool=""):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as arquivo:
+        caminho_resultado = arquivo.name
+    ambiente = dict(os.environ, REGISTRO_DATABASE_URI=f"sqlite:///{os.path.abspath(banco)}", REGISTRO_SPOOL=spool,
+                    REGISTRO_ARQUIVO="")
+    comando = [sys.executable, os.path.abspath(__file__), "--cenario", cenario, "--banco", banco,
+               "--linhas", str(args.linhas_atual), "--resultado", caminho_resultado,
+               "--repeticoes", str(args.repeticoes), "--mensagens", str(args.mensagens),
+               "--lotes", str(args.lotes), "--timeout", str(args.timeout)]
+    inicio = time.perf_counter()
+    try:
+        processo = subprocess.run(comando, env=ambiente, cwd=PASTA_PROJETO, stderr=subprocess.PIPE,
+                                  text=True, timeout=args.timeout * 10)
+        if processo.returncode != 0:
+            return {"erro": processo.stderr.strip().splitlines()[-1] if processo.stderr.strip() else
+                    f"código de saída {processo.returncode}"}
+        with open(caminho_resultado) as arquivo:
+            resultado = json.load(arquivo)
+        if isinstance(resultado, dict):
+            resultado["processo_s"] = round(time.perf_counter() - inicio, 3)
+        return resultado
+    except subprocess.TimeoutExpired:
+        return {"erro": "tempo esgotado"}
+    finally:
+        os.remove(caminho_resultado)
+
+
+def semeia(banco, args):
+    # Cria o banco com args.linhas_atual leituras e recalcula os agregados pela CLI da aplicação
+    resultado = roda("semeia", banco, args)
+    if "erro" in resultado:
+        return resultado
+    ambiente = dict(os.environ, REGISTRO_DATABASE_URI=f"sqlite:///{os.path.abspath(banco)}", REGISTRO_SPOOL="",
+                    REGISTRO_ARQUIVO="")
+    inicio = time.perf_counter()
+    processo = subprocess.run([sys.executable, "-m", "flask", "--app", "main", "recria-agregados"], env=ambiente,
+                              cwd=PASTA_PROJETO, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if processo.returncode != 0:
+        return {"erro": processo.stderr.strip().splitlines()[-1]}
+    resultado["agregados_s"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_PROJETO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compara(anterior, atual, caminho=""):
+    # Lista cada número presente nas duas execuções com a variação percentual
+    linhas = []
+    if isinstance(anterior, dict) and isinstance(atual, dict):
+        for chave in atual:
+            if chave in anterior:
+                linhas += compara(anterior[chave], atual[chave], f"{caminho}.{chave}" if caminho else chave)
+    elif isinstance(anterior, (int, float)) and isinstance(atual, (int, float)) and not isinstance(atual, bool):
+        variacao = (atual - anterior) / anterior * 100 if anterior else 0.0
+        linhas.append((caminho, anterior, atual, variacao))
+    return linhas
+
+
+def resumo(resultados):
+    for linhas, cenarios in resultados.items():
+        print(f"\n=== {linhas} registros ===")
+        for nome, valores in cenarios.items():
+            if not isinstance(valores, dict) or "erro" in valores:
+                print(f"  {nome}: {valores.get('erro') if isinstance(valores, dict) else valores}")
+                continue
+            if nome.startswith("mqtt"):
+                leituras_s = round(valores['callback_msgs_s'] * valores.get('leituras_por_mensagem', 1), 1)
+                print(f"  {nome}: callback {valores['callback_msgs_s']} msg/s ({leituras_s} leituras/s), "
+                      f"gravação {valores['gravadas_msgs_s']} leituras/s, pico {valores['pico_rss_mb']} MB")
+            elif nome == "leitura":
+                for rota, medidas in valores.items():
+                    if isinstance(medidas, dict) and "frio" in medidas:
+                        print(f"  {rota:26} p50 {medidas['frio']['p50_ms']:>9} ms  p99 {medidas['frio']['p99_ms']:>9} ms"
+                              f"  (cache p50 {medidas['cache']['p50_ms']} ms)")
+            elif nome in ("completo", "paginado"):
+                print(f"  {nome}: {valores['segundos']} s, {valores['bytes']} bytes, pico {valores['pico_rss_mb']} MB")
+            elif nome == "dash":
+                print(f"  dash: carga inicial {valores['carga_inicial_s']} s ({valores['linhas']} linhas), "
+                      f"pico {valores['pico_rss_mb']} MB")
+            elif nome == "post":
+                print(f"  post /data p50 {valores['post_data']['p50_ms']} ms, "
+                      f"/data/batch (1000) p50 {valores['post_data_batch_1000']['p50_ms']} ms")
+            else:
+                print(f"  {nome}: {valores}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline da ingestão, da API e do dashboard")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="tamanhos dos bancos semeados")
+    parser.add_argument("--cenarios", nargs="+", default=CENARIOS_LEITURA + CENARIOS_ESCRITA,
+                        choices=CENARIOS_LEITURA + CENARIOS_ESCRITA)
+    parser.add_argument("--repeticoes", type=int, default=30, help="requisições por rota")
+    parser.add_argument("--mensagens", type=int, default=20000, help="leituras MQTT sintéticas")
+    parser.add_argument("--lotes", type=int, default=5, help="lotes de 1000 registros em POST /data/batch")
+    parser.add_argument("--timeout", type=float, default=120, help="espera máxima (s) pela gravação da ingestão")
+    parser.add_argument("--pasta", help="onde guardar os bancos semeados (padrão: pasta temporária)")
+    parser.add_argument("--saida", default="benchmark_resultado.json")
+    parser.add_argument("--compara", help="JSON de uma execução anterior para comparar")
+    # Uso interno (subprocesso de cada cenário)
+    parser.add_argument("--cenario", choices=list(CENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument("--banco", help=argparse.SUPPRESS)
+    parser.add_argument("--resultado", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cenario:
+        args.linhas = args.linhas[0]
+        executa_cenario(args)
+        return
+
+    pasta = args.pasta or tempfile.mkdtemp(prefix="benchmark_registro_")
+    os.makedirs(pasta, exist_ok=True)
+    resultados = {}
+    for linhas in args.linhas:
+        args.linhas_atual = linhas
+        banco = os.path.join(pasta, f"registro_{linhas}.db")
+        cenarios = resultados[str(linhas)] = {}
+        if not os.path.exists(banco):
+            print(f"Semeando {linhas} registros em {banco}...")
+            cenarios["semeadura"] = semeia(banco, args)
+            if "erro" in cenarios["semeadura"]:
+                os.remove(banco)
+                continue
+        for cenario in args.cenarios:
+            print(f"{linhas} registros: {cenario}...")
+            if cenario in CENARIOS_ESCRITA:
+                copia = os.path.join(pasta, f"escrita_{linhas}.db")
+                shutil.copyfile(banco, copia)
+                spool = os.path.join(pasta, "spool.db") if cenario == "mqtt_spool" else ""
+                cenarios[cenario] = roda(cenario, copia, args, spool)
+                for arquivo in [copia, spool, spool + "-wal", spool + "-shm"]:
+                    if arquivo and os.path.exists(arquivo):
+                        os.remove(arquivo)
+            else:
+                cenarios[cenario] = roda(cenario, banco, args)
+
+    saida = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"linhas": args.linhas, "repeticoes": args.repeticoes, "mensagens": args.mensagens,
+                       "lotes": args.lotes, "dispositivos": DISPOSITIVOS},
+        "resultados": resultados,
+    }
+    with open(args.saida, "w") as arquivo:
+        json.dump(saida, arquivo, indent=2)
+    resumo(resultados)
+    print(f"\nResultado gravado em {args.saida}")
+
+    if args.compara:
+        with open(args.compara) as arquivo:
+            anterior = json.load(arquivo)
+        print(f"\nComparação com {args.compara} ({anterior.get('commit')}):")
+        for caminho, antes, depois, variacao in compara(anterior["resultados"], resultados):
+            print(f"  {caminho:70} {antes:>12} -> {depois:>12}  {variacao:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import threading
+
+# ********************* BUFFER CIRCULAR DE LEITURAS RECENTES *********************************
+# Guarda as últimas `capacidade` leituras, cada uma com um número de sequência crescente.
+# Quem publica (o MQTT) só grava na posição seguinte e avisa quem está esperando; cada leitor
+# acompanha a própria sequência, então um leitor lento nunca atrasa a ingestão: se ficar mais
+# de `capacidade` leituras para trás, ele simplesmente perde as mais antigas.
+#
+# A sequência recomeça do zero quando o processo reinicia: um leitor com sequência à frente da
+# atual (Last-Event-ID de antes do reinício) é tratado como reinício e recebe o buffer desde o começo.
+
+
+class BufferCircular:
+
+    def __init__(self, capacidade=1000):
+        self.capacidade = capacidade
+        self._itens = [None] * capacidade
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def ultimo_seq(self):
+        return self._seq
+
+    def publica(self, leitura):
+        with self._cond:
+            self._seq += 1
+            self._itens[self._seq % self.capacidade] = (self._seq, leitura)
+            self._cond.notify_all()
+            return self._seq
+
+    def desde(self, seq, limite=None):
+        # Leituras com sequência maior que `seq`. Devolve (itens, último seq, quantidade perdida, reiniciado),
+        # onde "perdida" conta as leituras que já saíram do buffer antes de serem lidas e "reiniciado"
+        # indica que `seq` era de antes de um reinício (os itens começam pelo mais antigo do buffer).
+        with self._cond:
+            ultimo = self._seq
+            reiniciado = seq > ultimo
+            if reiniciado:
+                seq = 0
+            primeiro = max(seq + 1, ultimo - self.capacidade + 1, 1)
+            if limite is not None:
+                ultimo = min(ultimo, primeiro + limite - 1)
+            itens = [self._itens[s % self.capacidade] for s in range(primeiro, ultimo + 1)]
+        perdidos = max(0, primeiro - (seq + 1))
+        return itens, max(ultimo, seq), perdidos, reiniciado
+
+    def espera(self, seq, timeout=None):
+        # Bloqueia até existir uma leitura com sequência maior que `seq` (ou até o timeout); não espera
+        # se `seq` for de antes de um reinício
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq != seq, timeout)
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# ********************* CACHE DE RESPOSTAS HTTP *********************************
+# Guarda o corpo das respostas GET por rota + parâmetros, em um LRU limitado por quantidade
+# de itens e por tempo de vida. Toda gravação na tabela registro incrementa a versão do cache;
+# respostas guardadas em uma versão anterior deixam de valer, e o ETag (que inclui a versão)
+# permite responder 304 Not Modified sem consultar o banco.
+#
+# Gravações feitas por outro processo não passam por invalida(): por isso o ETag também muda a
+# cada `ttl` segundos, e nem o corpo guardado nem um 304 valem mais que o tempo de vida.
+
+
+class CacheRespostas:
+
+    def __init__(self, max_itens=256, ttl_s=30, max_bytes=1048576):
+        self.max_itens = max_itens
+        self.ttl = ttl_s
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._versao = 0
+        self._inicio = os.urandom(4).hex()
+        # Identifica esta execução do processo, para que um ETag antigo não valha depois de reiniciar.
+        self.alterado_em = time.time()
+        self.acertos = 0
+        self.falhas = 0
+
+    @property
+    def versao(self):
+        return self._versao
+
+    def invalida(self):
+        # Chamado depois de cada commit que altera a tabela registro
+        with self._lock:
+            self._versao += 1
+            self.alterado_em = time.time()
+            self._itens.clear()
+
+    def etag(self, chave, versao=None):
+        versao = self._versao if versao is None else versao
+        if self.ttl:
+            versao = f"{versao}.{int(time.time() // self.ttl)}"
+        return f"{self._inicio}-{versao}-{zlib.crc32(chave.encode()):08x}"
+
+    def obtem(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] != self._versao or time.monotonic() - item[1] > self.ttl:
+                if item is not None:
+                    del self._itens[chave]
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[2]
+
+    def guarda(self, chave, versao, resposta):
+        # resposta: (corpo em bytes, status, mimetype). Só guarda se a versão ainda for a atual.
+        if len(resposta[0]) > self.max_bytes:
+            return
+        with self._lock:
+            if versao != self._versao:
+                return
+            self._itens[chave] = (versao, time.monotonic(), resposta)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def status(self):
+        with self._lock:
+            return {"versao": self._versao, "itens": len(self._itens), "acertos": self.acertos, "falhas": self.falhas}
@@ -1,41 +1,226 @@
 import json
+import logging
+import os
+import threading
 import time
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import paho.mqtt.client as mqtt
+from buffer_leituras import BufferCircular
+from observabilidade import configura_log
+from payload_binario import colunas as colunas_binario, decodifica, eh_binario
+
+# ********************* RELAY DE BORDA *********************************
+# Uma única assinatura no broker repassada a quantos clientes locais houver: GET /data (último
+# valor), GET /data/history (mensagens recentes) e GET /data/stream (Server-Sent Events). Um
+# visualizador a mais não abre nada no broker; custa só uma leitura da memória do relay.
+#
+# A thread do MQTT é a única que escreve. Cada mensagem é serializada uma vez só na chegada e
+# vira uma tupla imutável (seq, evento, dados) que substitui a anterior de uma vez: quem lê
+# pega a tupla inteira, sem trava. O histórico curto fica em um BufferCircular, em que cada
+# cliente SSE anda no próprio ritmo; quem fica para trás recebe só a mensagem mais recente de
+# cada tópico (coalescida) em vez de todo o atraso.
 
 app = Flask(__name__)
 
-# Variável global para armazenar os dados recebidos do MQTT
-mqtt_data = {}
+app.config['RELAY_BROKER'] = os.environ.get('RELAY_BROKER', 'test.mosquitto.org')  # SERVIDOR PUBLICO
+app.config['RELAY_PORTA'] = int(os.environ.get('RELAY_PORTA', 1883))
+app.config['RELAY_TOPICOS'] = ['projeto_integrado/SENAI134/Cienciadedados/GrupoX',
+                               'projeto_integrado/SENAI134/Cienciadedados/GrupoX/bin']  # TOPICOS QUE O ESP32 ESTARÁ PUBLICANDO
+app.config['RELAY_KEEPALIVE_S'] = 60  # Keepalive da conexão com o broker
+app.config['RELAY_RECONEXAO_MIN_S'] = 1  # Espera antes da primeira tentativa de reconexão ao broker...
+app.config['RELAY_RECONEXAO_MAX_S'] = 120  # ... dobrando a cada falha até esse máximo
+app.config['RELAY_HISTORICO'] = 500  # Mensagens recentes mantidas em memória para /data/history e /data/stream
+app.config['RELAY_ATRASO_MAX'] = 50  # Cliente SSE com mais mensagens pendentes que isso recebe só a última de cada tópico
+app.config['RELAY_INTERVALO_MIN_MS'] = 100  # Menor ?intervalo_ms= aceito em /data/stream
+app.config['SSE_KEEPALIVE_S'] = 15  # Intervalo (s) do comentário enviado às conexões SSE sem mensagens novas
+
+configura_log(os.environ.get('RELAY_LOG_NIVEL', 'INFO'))
+log = logging.getLogger('registro.relay')
+
+historico = BufferCircular(app.config['RELAY_HISTORICO'])
+# Itens do histórico: (tópico, evento JSON já serializado)
+
+VAZIO = (0, None, "{}")
+INICIO = os.urandom(4).hex()  # prefixo dos ETags de /data: seq recomeça do zero quando o relay reinicia
+instantaneo = VAZIO  # (seq, evento JSON, dados JSON) da mensagem mais recente, trocada de uma vez
+por_topico = {}  # tópico -> tupla como a de instantaneo
+
+estado = {"conectado": False, "conexoes": 0, "desconexoes": 0, "mensagens": 0, "rejeitadas": 0,
+          "ultima_mensagem": None, "clientes_sse": 0}
+trava_clientes = threading.Lock()
+
+CHAVES_JSON = {"temperatura": "temperature", "pressao": "pressure", "altitude": "altitude", "umidade": "humidity",
+               "co2": "CO2"}
+# Leituras do payload binário são repassadas com as mesmas chaves do JSON do ESP32
+
+
+def dados_do_payload(topico, payload):
+    # Textos JSON das leituras de uma mensagem. Um JSON é repassado como chegou (só é validado);
+    # um payload binário vira um objeto por leitura. Lança ValueError se for inválido.
+    if eh_binario(topico, payload):
+        dispositivo, registros = decodifica(payload)
+        valores = colunas_binario(registros)
+        textos = []
+        for i, timestamp in enumerate(valores["timestamp"]):
+            leitura = {chave: valores[campo][i] for campo, chave in CHAVES_JSON.items()}
+            leitura["timestamp"] = timestamp
+            if dispositivo:
+                leitura["device_id"] = dispositivo
+            textos.append(json.dumps(leitura))
+        return textos
+    texto = payload.decode('utf-8')
+    json.loads(texto)
+    return [texto]
+
+
+# Função de callback chamada quando a conexão MQTT é estabelecida (também a cada reconexão)
+def on_connect(client, userdata, flags, rc, properties=None):
+    estado["conectado"] = rc == 0
+    estado["conexoes"] += rc == 0
+    log.info("Conectado ao broker %s (código %s)", app.config['RELAY_BROKER'], rc)
+    client.subscribe([(topico, 0) for topico in app.config['RELAY_TOPICOS']])
+
+
+def on_disconnect(client, userdata, rc, properties=None):
+    # O loop do paho reconecta sozinho, esperando de RELAY_RECONEXAO_MIN_S a RELAY_RECONEXAO_MAX_S
+    estado["conectado"] = False
+    estado["desconexoes"] += 1
+    log.warning("Desconectado do broker (código %s); reconectando", rc)
 
-# Função de callback chamada quando a conexão MQTT é estabelecida
-def on_connect(client, userdata, flags, rc):
-    print("Connected with result code " + str(rc))
-    # Subscreva no tópico desejado
-    client.subscribe("projeto_integrado/SENAI134/Cienciadedados/GrupoX") #TOPICO QUE O ESP32 ESTARÁ PUBLICANDO
 
 # Função de callback chamada quando uma mensagem é recebida
 def on_message(client, userdata, msg):
-    global mqtt_data
-    payload = msg.payload.decode('utf-8')
-    mqtt_data = json.loads(payload)
-    print(f"Received message: {mqtt_data}")
+    global instantaneo
+    try:
+        textos = dados_do_payload(msg.topic, msg.payload)
+    except (UnicodeDecodeError, ValueError) as e:
+        estado["rejeitadas"] += 1
+        log.warning("Mensagem inválida em %s: %s", msg.topic, e)
+        return
+    recebido_em = round(time.time(), 3)
+    prefixo = f'{{"topico": {json.dumps(msg.topic)}, "recebido_em": {recebido_em}, "dados": '
+    for texto in textos:
+        evento = prefixo + texto + "}"
+        seq = historico.publica((msg.topic, evento))
+        atual = (seq, evento, texto)
+        por_topico[msg.topic] = atual
+        instantaneo = atual
+    estado["mensagens"] += 1
+    estado["ultima_mensagem"] = recebido_em
+    log.debug("Mensagem recebida em %s: %s", msg.topic, textos)
+
 
 # Configure o cliente MQTT
 mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_connect
+mqtt_client.on_disconnect = on_disconnect
 mqtt_client.on_message = on_message
-mqtt_client.connect("test.mosquitto.org", 1883, 60) #SERVIDOR PUBLICO
 
-# Função para iniciar o loop MQTT em uma thread separada
+
+# Função para iniciar o loop MQTT em uma thread separada. connect_async não falha se o broker estiver
+# fora do ar: a primeira conexão e as reconexões acontecem no loop, com espera crescente.
 def start_mqtt():
+    mqtt_client.reconnect_delay_set(min_delay=app.config['RELAY_RECONEXAO_MIN_S'],
+                                    max_delay=app.config['RELAY_RECONEXAO_MAX_S'])
+    mqtt_client.connect_async(app.config['RELAY_BROKER'], app.config['RELAY_PORTA'], app.config['RELAY_KEEPALIVE_S'])
     mqtt_client.loop_start()
 
-# Endpoint para obter os dados mais recentes
+
+# Endpoint para obter os dados mais recentes (?topico= para um tópico específico)
 @app.route('/data', methods=['GET'])
 def get_data():
-    return jsonify(mqtt_data)
+    topico = request.args.get('topico')
+    seq, _, texto = instantaneo if topico is None else por_topico.get(topico, VAZIO)
+    resposta = Response(texto, mimetype='application/json')
+    resposta.set_etag(f"{INICIO}-{seq}")
+    return resposta.make_conditional(request)
+
+
+@app.route('/data/history', methods=['GET'])
+def get_data_history():
+    # Mensagens com sequência maior que ?since= (padrão: todo o histórico), montadas com os
+    # textos já serializados na chegada. "reiniciado": o since era de antes de um reinício do relay.
+    try:
+        since = int(request.args.get('since', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "Parâmetros since/limit inválidos"}), 400
+    topico = request.args.get('topico')
+    itens, seq, perdidos, reiniciado = historico.desde(since, limit)
+    mensagens = ",".join(f'{{"seq": {s}, {evento[1:]}' for s, (topico_item, evento) in itens
+                         if topico is None or topico_item == topico)
+    return Response(f'{{"seq": {seq}, "perdidos": {perdidos}, "reiniciado": {json.dumps(reiniciado)}, '
+                    f'"mensagens": [{mensagens}]}}', mimetype='application/json')
+
+
+def coalesce(itens):
+    # Só a mensagem mais recente de cada tópico, na ordem de chegada
+    ultimas = {}
+    for s, item in itens:
+        ultimas[item[0]] = (s, item)
+    return sorted(ultimas.values(), key=lambda par: par[0])
+
+
+@app.route('/data/stream', methods=['GET'])
+def get_data_stream():
+    # Server-Sent Events. Cada conexão lê o histórico no próprio ritmo: se ficar mais de
+    # RELAY_ATRASO_MAX mensagens para trás (ou perder mensagens que já saíram do histórico), recebe
+    # só a última de cada tópico e um evento "coalescidas" com quantas pulou. Com ?intervalo_ms=, o
+    # cliente recebe no máximo um envio por intervalo, sempre coalescido. Um Last-Event-ID de antes de
+    # um reinício do relay gera o evento "reiniciado" e o histórico desde o começo.
+    try:
+        seq = int(request.headers.get('Last-Event-ID') or request.args.get('since', historico.ultimo_seq))
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID/since inválido"}), 400
+    try:
+        intervalo = request.args.get('intervalo_ms')
+        intervalo = max(int(intervalo), app.config['RELAY_INTERVALO_MIN_MS']) / 1000 if intervalo else None
+    except ValueError:
+        return jsonify({"error": "Parâmetro intervalo_ms inválido"}), 400
+    topico = request.args.get('topico')
+    keepalive = app.config['SSE_KEEPALIVE_S']
+    atraso_max = app.config['RELAY_ATRASO_MAX']
+
+    def eventos(seq):
+        with trava_clientes:
+            estado["clientes_sse"] += 1
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if not historico.espera(seq, keepalive):
+                    yield ": keepalive\n\n"
+                    continue
+                if intervalo:
+                    time.sleep(intervalo)
+                itens, seq, perdidos, reiniciado = historico.desde(seq)
+                if topico is not None:
+                    itens = [(s, item) for s, item in itens if item[0] == topico]
+                puladas = perdidos
+                if intervalo or perdidos or len(itens) > atraso_max:
+                    enviadas = coalesce(itens)
+                    puladas += len(itens) - len(enviadas)
+                    itens = enviadas
+                partes = [f"event: reiniciado\ndata: {seq}\n\n"] if reiniciado else []
+                partes += [f"event: coalescidas\ndata: {puladas}\n\n"] if puladas else []
+                partes += [f"id: {s}\nevent: mensagem\ndata: {evento}\n\n" for s, (_, evento) in itens]
+                if partes:
+                    yield "".join(partes)
+        finally:
+            with trava_clientes:
+                estado["clientes_sse"] -= 1
+
+    return Response(eventos(seq), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/status', methods=['GET'])
+def get_status():
+    return jsonify(dict(estado, broker=app.config['RELAY_BROKER'], topicos=app.config['RELAY_TOPICOS'],
+                        seq=historico.ultimo_seq, topicos_recebidos=len(por_topico)))
+
 
 if __name__ == '__main__':
     start_mqtt()
-    app.run(host='0.0.0.0', port=5000)
+    # threaded: cada cliente SSE ocupa uma thread enquanto estiver conectado
+    app.run(host='0.0.0.0', port=5000, threaded=True)
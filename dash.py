@@ -4,32 +4,110 @@ import pandas as pd
 #  Importa o Pandas, uma biblioteca para manipulação e análise de dados.
 import plotly.express as px
 # Importa o Plotly Express, uma biblioteca para criação de gráficos interativos.
+import numpy as np
+# Importa o NumPy, usado para filtrar e agrupar os dados de forma vetorizada.
 from query import *
 # Importa todas as funções e variáveis do módulo query, que pode incluir a função view_all_data() usada para obter dados de uma API.
+import threading
+import time
+from collections import deque
+# Importa threading, time e deque, usados no cache incremental dos dados e no modo ao vivo.
 
 st.set_page_config(page_title="Dashboard", page_icon="", layout="wide")
 # Configura a página do aplicativo Streamlit, definindo o título como "Dashboard", sem ícone específico (page_icon="") 
 # e o layout como "wide", o que significa que a página ocupará toda a largura da tela.
 
-@st.cache_data
-# Decorador que indica que a função load_data deve ter seus resultados em cache para melhorar o desempenho, 
-# evitando carregamentos repetidos.
-def load_data():
-# Define uma função para carregar dados da API.
-    result = view_all_data()
-#  Chama a função view_all_data() para obter os dados da API.
-    df = pd.DataFrame(result, columns=["id", "temperatura", "pressao" , "altitude", "umidade", "co2", "tempo_registro"])
-# Converte os resultados obtidos em um DataFrame do Pandas, especificando as colunas correspondentes.
-    return df
-#  Retorna o DataFrame df.
-
-df = load_data()
-# Carrega os dados da API chamando a função load_data() e armazena o DataFrame resultante na variável df.
+TTL_SEGUNDOS = 60
+# Tempo (em segundos) que os dados em memória são considerados atuais; depois disso a próxima
+# execução busca no banco apenas os registros novos.
+HISTORICO_MAX = 500000
+# Número máximo de registros mantidos em memória; os mais antigos são descartados.
+
+@st.cache_resource
+# Decorador que mantém um único objeto compartilhado entre todas as sessões e execuções do script.
+def cache_registros():
+    return {"df": None, "ultimo_id": 0, "atualizado_em": 0.0, "versao": 0, "lock": threading.Lock()}
+# Guarda o DataFrame carregado junto com o maior id já lido (ultimo_id), o horário da última
+# atualização e uma versão que muda sempre que chegam registros novos.
+
+def load_data(forcar=False):
+# Define uma função para carregar os dados de forma incremental.
+    cache = cache_registros()
+    with cache["lock"]:
+    # Evita que duas sessões atualizem o mesmo cache ao mesmo tempo.
+        if cache["df"] is None:
+            novos = view_last_data(HISTORICO_MAX)
+            cache["df"] = novos
+        # Primeira carga: busca apenas os últimos HISTORICO_MAX registros, já com colunas
+        # float64/datetime64 (veja query.consulta_colunar). Com REGISTRO_ARQUIVO definido, o histórico
+        # vem do arquivo Parquet e o banco só entrega as leituras ainda não arquivadas.
+        elif forcar or time.time() - cache["atualizado_em"] >= TTL_SEGUNDOS:
+            novos = view_new_data(cache["ultimo_id"])
+            if not novos.empty:
+                df = pd.concat([cache["df"], novos], ignore_index=True)
+                if len(df) > HISTORICO_MAX:
+                    df = df.iloc[-HISTORICO_MAX:].reset_index(drop=True)
+                cache["df"] = df
+        # Atualização: busca apenas os registros com id maior que o último carregado e
+        # acrescenta ao final, descartando os mais antigos se passar de HISTORICO_MAX.
+        else:
+            return cache["df"]
+
+        if not novos.empty:
+            cache["ultimo_id"] = int(novos["id"].iloc[-1])
+            cache["versao"] += 1
+        cache["atualizado_em"] = time.time()
+        return cache["df"]
+#  Retorna o DataFrame com todos os registros em memória.
+
+@st.cache_data(ttl=TTL_SEGUNDOS)
+def limites_api():
+    stats = api_stats()
+    if not stats["contagem"]:
+        return None
+    return {coluna: limites_finitos(stats[coluna]["min"], stats[coluna]["max"], FILTROS[coluna][1]) for coluna in FILTROS}
+# No modo API (REGISTRO_API_URL definido), os limites dos sliders vêm de GET /registro/stats.
+
+@st.cache_resource(ttl=TTL_SEGUNDOS, max_entries=4)
+def carrega_periodo(inicio, fim):
+    return view_history(inicio, fim)
+# Registros de um intervalo de datas, compartilhados entre as sessões (sem cópia) por TTL_SEGUNDOS.
+# Com REGISTRO_ARQUIVO definido, vêm do arquivo Parquet (só os dias do intervalo) e do banco só as
+# leituras ainda não arquivadas (veja query.view_history).
+
+st.sidebar.header("Período")
+if API_URL:
+    periodo = ()
+else:
+    periodo = st.sidebar.date_input("Intervalo de datas (UTC)", value=(),
+                                    help="Vazio: os registros mais recentes. Com início e fim: todos os registros desses dias.")
+periodo = tuple(periodo) if isinstance(periodo, (tuple, list)) else ()
+if len(periodo) == 2:
+    inicio_periodo = int(pd.Timestamp(periodo[0]).tz_localize("UTC").timestamp())
+    fim_periodo = int(pd.Timestamp(periodo[1]).tz_localize("UTC").timestamp()) + 86400
+else:
+    inicio_periodo = fim_periodo = None
+# O fim do intervalo inclui o último dia inteiro.
+
+if API_URL:
+    df = None
+# No modo API os registros não são carregados: KPIs e gráficos são calculados pelo servidor.
+elif inicio_periodo is not None:
+    df = carrega_periodo(inicio_periodo, fim_periodo)
+else:
+    df = load_data()
+# Carrega os dados (do cache em memória ou, se o TTL expirou, buscando só os registros novos).
 
 # Botão para atualizar os dados
 if st.button("Atualizar Dados"):
-    df = load_data()
-# Verifica se o botão "Atualizar Dados" foi pressionado. Se sim, recarrega os dados da API e atualiza o DataFrame df.
+    if API_URL:
+        limites_api.clear()
+    elif inicio_periodo is not None:
+        carrega_periodo.clear()
+        df = carrega_periodo(inicio_periodo, fim_periodo)
+    else:
+        df = load_data(forcar=True)
+# Verifica se o botão "Atualizar Dados" foi pressionado. Se sim, busca imediatamente os registros novos.
 
 # Sidebar
 st.sidebar.header("Selecione a Informação para Gráficos")
@@ -63,114 +141,165 @@ def filtros(attribute):
 st.sidebar.header("Selecione o Filtro")
 # Adiciona um cabeçalho "Selecione o Filtro" na barra lateral, indicando que abaixo dessa linha serão exibidos filtros de dados.
 
+FILTROS = {
+    "temperatura": ("Temperatura (°C)", 0.1),
+    "pressao": ("Pressão (hPa)", 0.1),
+    "altitude": ("Altitude (m)", 1.0),
+    "umidade": ("Umidade (%)", 0.1),
+    "co2": ("CO2 (ppm)", 1.0),
+}
+# Rótulo e incremento do slider de cada atributo.
+
+def limites_finitos(minimo, maximo, passo):
+    if minimo is None or maximo is None or not np.isfinite(minimo) or not np.isfinite(maximo):
+        minimo = maximo = 0.0
+    if minimo == maximo:
+        minimo, maximo = minimo - passo, maximo + passo
+    return float(minimo), float(maximo)
+# Limites válidos para o st.slider: uma coluna sem nenhum valor (toda NULL) fica com uma faixa em
+# torno de 0, e uma coluna com um único valor ganha um passo para cada lado (o slider exige mínimo < máximo).
+
+def limites_de(dados):
+    return {coluna: limites_finitos(dados[coluna].min(), dados[coluna].max(), passo)
+            for coluna, (_, passo) in FILTROS.items()}
+
+@st.cache_data
+# Os limites só mudam quando chegam registros novos, então são calculados uma vez por versão dos dados.
+def limites_colunas(versao):
+    return limites_de(cache_registros()["df"])
+# Calcula o mínimo e o máximo de cada atributo. O parâmetro versao (que muda a cada carga de dados
+# novos) é a chave do cache: enquanto ele não mudar, o resultado anterior é reaproveitado.
+
+if API_URL:
+    limites = limites_api()
+elif df.empty:
+    limites = None
+elif inicio_periodo is not None:
+    limites = limites_de(df)
+else:
+    limites = limites_colunas(cache_registros()["versao"])
+
+if limites is None:
+    st.info("Nenhum registro disponível.")
+    st.stop()
+# Sem registros não há limites para os sliders; exibe um aviso e interrompe o script.
 
 # Exibir sliders apenas se o atributo correspondente for selecionado
-if filtros("temperatura"):
-# Exibe um controle deslizante (slider) na barra lateral para filtrar a temperatura, 
-# mas apenas se a temperatura estiver selecionada como eixo X ou Y.
-    temperatura_range = st.sidebar.slider(
-        "Temperatura (°C)",
-        min_value=float(df["temperatura"].min()),
-    # Valor mínimo do slider, baseado nos dados carregados.
-        max_value=float(df["temperatura"].max()),
-    # Valor máximo do slider.
-        value=(float(df["temperatura"].min()), float(df["temperatura"].max())),
-    # Faixa de valores padrão selecionada.
-        step=0.1
-    # Incremento para cada movimento do slider.
-    )
-
-if filtros("pressao"):
-    pressao_range = st.sidebar.slider(
-        "Pressão (hPa)",
-        min_value=float(df["pressao"].min()),
-        max_value=float(df["pressao"].max()),
-        value=(float(df["pressao"].min()), float(df["pressao"].max())),
-        step=0.1
-    )
-# Exibe um controle deslizante para filtrar a pressão, com funcionamento similar ao slider de temperatura.
-
-if filtros("altitude"):
-    altitude_range = st.sidebar.slider(
-        "Altitude (m)",
-        min_value=float(df["altitude"].min()),
-        max_value=float(df["altitude"].max()),
-        value=(float(df["altitude"].min()), float(df["altitude"].max())),
-        step=1.0
-    )
-# Exibe um controle deslizante para filtrar a altitude.
-
-if filtros("umidade"):
-    umidade_range = st.sidebar.slider(
-        "Umidade (%)",
-        min_value=float(df["umidade"].min()),
-        max_value=float(df["umidade"].max()),
-        value=(float(df["umidade"].min()), float(df["umidade"].max())),
-        step=0.1
-    )
-# Exibe um controle deslizante para filtrar a umidade.
-
-if filtros("co2"):
-    co2_range = st.sidebar.slider(
-        "CO2 (ppm)",
-        min_value=float(df["co2"].min()),
-        max_value=float(df["co2"].max()),
-        value=(float(df["co2"].min()), float(df["co2"].max())),
-        step=1.0
-    )
-# Exibe um controle deslizante para filtrar o CO2.
+faixas = {}
+for coluna, (rotulo, passo) in FILTROS.items():
+    if filtros(coluna):
+    # Exibe um controle deslizante (slider) na barra lateral para filtrar o atributo,
+    # mas apenas se ele estiver selecionado como eixo X ou Y.
+        minimo, maximo = limites[coluna]
+        faixas[coluna] = st.sidebar.slider(
+            rotulo,
+            min_value=minimo,
+        # Valor mínimo do slider, baseado nos dados carregados.
+            max_value=maximo,
+        # Valor máximo do slider.
+            value=(minimo, maximo),
+        # Faixa de valores padrão selecionada.
+            step=passo
+        # Incremento para cada movimento do slider.
+        )
+
+st.sidebar.header("Gráficos")
+num_intervalos = st.sidebar.slider("Número de intervalos do eixo X", min_value=5, max_value=200, value=30, step=5)
+# Os gráficos agrupam o eixo X nessa quantidade de intervalos, então o custo de desenhar não depende do número de registros.
+if API_URL:
+    tipo_intervalo = "Largura fixa"
+else:
+    tipo_intervalo = st.sidebar.radio("Tipo de intervalo", options=["Largura fixa", "Quantis"], horizontal=True)
+# Largura fixa: intervalos do mesmo tamanho. Quantis: intervalos com aproximadamente a mesma quantidade de registros.
+# O histograma do servidor usa apenas intervalos de largura fixa.
+
+st.sidebar.header("Modo ao vivo")
+modo_ao_vivo = st.sidebar.toggle("Ativar modo ao vivo", value=False)
+intervalo_ao_vivo = st.sidebar.number_input("Atualizar a cada (s)", min_value=0.5, max_value=60.0, value=1.0, step=0.5)
+# No modo ao vivo apenas os indicadores e o gráfico são atualizados, no intervalo escolhido.
 
 # Filtragem do DataFrame com base nos intervalos selecionados na sidebar
-df_selection = df.copy()
-# Cria uma cópia do DataFrame original df. Isso é feito para garantir que as operações 
-# subsequentes de filtragem sejam aplicadas em uma nova instância do DataFrame (df_selection),
-# sem alterar os dados originais em df.
-if filtros("temperatura"):
-# Verifica se a função filtros("temperatura") retorna True. Esta função provavelmente verifica 
-# se o atributo "temperatura" deve ser filtrado (por exemplo, 
-# se o usuário selecionou essa coluna em um painel de filtros).
-    df_selection = df_selection[
-# Aqui, a filtragem está sendo aplicada à coluna temperatura do DataFrame df_selection.
-        (df_selection["temperatura"] >= temperatura_range[0]) & 
-# Mantém apenas as linhas em que o valor da coluna temperatura é maior ou igual ao limite inferior (temperatura_range[0]).
-        (df_selection["temperatura"] <= temperatura_range[1])
-# Mantém apenas as linhas em que o valor da coluna temperatura é menor ou igual ao limite superior (temperatura_range[1]).
-    ]
-# Cria uma cópia do DataFrame df e filtra os dados com base no intervalo selecionado para a temperatura, se aplicável.
-
-if filtros("pressao"):
-    df_selection = df_selection[
-        (df_selection["pressao"] >= pressao_range[0]) & 
-        (df_selection["pressao"] <= pressao_range[1])
-    ]
-# Filtra os dados com base no intervalo selecionado para a pressão, se aplicável.
-
-if filtros("altitude"):
-    df_selection = df_selection[
-        (df_selection["altitude"] >= altitude_range[0]) & 
-        (df_selection["altitude"] <= altitude_range[1])
-    ]
-# Filtra os dados com base no intervalo selecionado para a altitude, se aplicável.
-
-if filtros("umidade"):
-    df_selection = df_selection[
-        (df_selection["umidade"] >= umidade_range[0]) & 
-        (df_selection["umidade"] <= umidade_range[1])
-    ]
-# Filtra os dados com base no intervalo selecionado para a umidade, se aplicável.
-
-if filtros("co2"):
-    df_selection = df_selection[
-        (df_selection["co2"] >= co2_range[0]) & 
-        (df_selection["co2"] <= co2_range[1])
-    ]
-# Filtra os dados com base no intervalo selecionado para o CO2, se aplicável.
+def seleciona(dados, faixas):
+    mascara = np.ones(len(dados), dtype=bool)
+    for coluna, (minimo, maximo) in faixas.items():
+        valores = dados[coluna].to_numpy()
+        mascara &= (valores >= minimo) & (valores <= maximo)
+    if mascara.all():
+        return dados
+    return dados[mascara]
+# Combina todos os filtros ativos em uma única máscara booleana do NumPy e aplica uma única vez.
+# Se nenhum registro for excluído, devolve o próprio DataFrame, sem cópia.
+
+df_selection = seleciona(df, faixas) if df is not None else None
+
+def agrupa_intervalos(dados, x, y, bins, quantis=False):
+    valores_x = dados[x].to_numpy(dtype=np.float64)
+    valores_y = dados[y].to_numpy(dtype=np.float64)
+    validos = ~np.isnan(valores_x)
+    valores_x, valores_y = valores_x[validos], valores_y[validos]
+    if not len(valores_x):
+        return pd.DataFrame({x: [], "contagem": [], y: []})
+    # Nenhum valor de X na seleção: resultado vazio (o gráfico não é desenhado).
+    minimo, maximo = valores_x.min(), valores_x.max()
+    if minimo == maximo:
+        bordas = np.array([minimo - 0.5, maximo + 0.5])
+    # Todos os valores iguais: um único intervalo centrado no valor.
+    elif quantis:
+        bordas = np.unique(np.quantile(valores_x, np.linspace(0, 1, bins + 1)))
+    else:
+        bordas = np.linspace(minimo, maximo, bins + 1)
+    indices = np.clip(np.searchsorted(bordas, valores_x, side="right") - 1, 0, len(bordas) - 2)
+    total = len(bordas) - 1
+    contagem = np.bincount(indices, minlength=total)
+    com_y = ~np.isnan(valores_y)
+    contagem_y = np.bincount(indices[com_y], minlength=total)
+    soma_y = np.bincount(indices[com_y], weights=valores_y[com_y], minlength=total)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_y = soma_y / contagem_y
+    return pd.DataFrame({
+        x: (bordas[:-1] + bordas[1:]) / 2,
+        "contagem": contagem,
+        y: media_y,
+    })
+# Divide o eixo X em intervalos (largura fixa ou quantis) e calcula, para cada intervalo, a quantidade
+# de registros e a média de Y, usando np.bincount em vez de um groupby por valor distinto.
+# O eixo X do resultado é o centro de cada intervalo.
+
+def medias_selecao():
+    if API_URL:
+        stats = api_stats(faixas)
+        if not stats["contagem"]:
+            return None
+        return {coluna: stats[coluna]["media"] if stats[coluna]["media"] is not None else float("nan")
+                for coluna in FILTROS}
+    if df_selection.empty:
+        return None
+    return {coluna: df_selection[coluna].mean() for coluna in FILTROS}
+# Média de cada atributo na seleção atual: calculada pelo servidor (GET /registro/stats com as faixas
+# dos sliders) no modo API, ou localmente sobre df_selection. Devolve None se não houver registros.
+
+def dados_grafico():
+    if API_URL:
+        histograma = api_histogram(x_axis, y_axis, num_intervalos, faixas)
+        return pd.DataFrame({
+            x_axis: [intervalo["centro"] for intervalo in histograma["intervalos"]],
+            "contagem": [intervalo["contagem"] for intervalo in histograma["intervalos"]],
+            y_axis: [intervalo["media_y"] for intervalo in histograma["intervalos"]],
+        })
+    if df_selection.empty:
+        return pd.DataFrame()
+    return agrupa_intervalos(df_selection, x_axis, y_axis, num_intervalos, tipo_intervalo == "Quantis")
+# Contagem e média de Y por intervalo de X: GET /registro/histogram no modo API, ou agrupa_intervalos localmente.
 
 def Home():
 # Define a função Home(), responsável por exibir os dados tabulares filtrados.
     with st.expander("Tabular"):
 # Cria uma seção expansível intitulada "Tabular". Usuário pode expandir ou recolher essa área conforme necessário.
-        showData = st.multiselect('Filter: ', df_selection.columns, default=[], key="showData_home")
+        if API_URL:
+            st.caption("A tabela não está disponível no modo API, que não carrega os registros.")
+            showData = []
+        else:
+            showData = st.multiselect('Filter: ', df_selection.columns, default=[], key="showData_home")
 # Permite ao usuário selecionar colunas específicas para exibição em uma tabela.
         if showData:
 # Exibe os dados filtrados apenas se o usuário selecionar alguma coluna.
@@ -180,14 +309,14 @@ def Home():
 # df_selection[showData] cria um novo DataFrame contendo apenas as colunas escolhidas.
         
     # Compute top analytics
-    if not df_selection.empty:
-# Verifica se o DataFrame df_selection não está vazio.
-#  O operador not inverte essa lógica, ou seja, o código dentro deste bloco será executado apenas se df_selection contiver dados.
-        media_umidade = df_selection["umidade"].mean()
-        media_temperatura = df_selection["temperatura"].mean()
-        media_co2 = df_selection["co2"].mean()
-        media_pressao = df_selection["pressao"].mean()
-# Calcula a média de valores das colunas selecionadas no DataFrame df_selection.
+    medias = medias_selecao()
+    if medias is not None:
+# Verifica se a seleção contém registros.
+        media_umidade = medias["umidade"]
+        media_temperatura = medias["temperatura"]
+        media_co2 = medias["co2"]
+        media_pressao = medias["pressao"]
+# Obtém a média de cada atributo na seleção (calculada localmente ou pela API).
 # As médias calculadas são armazenadas nas variáveis media_umidade, media_temperatura, media_co2 e media_pressao.
 
         total1, total2, total3, total4 = st.columns(4, gap='large')
@@ -218,10 +347,11 @@ def Home():
 
 def graphs():
 # Define a função graphs(), responsável por gerar e exibir gráficos.
-    if df_selection.empty:
+    grouped_data = dados_grafico()
+    if grouped_data.empty or grouped_data["contagem"].sum() == 0:
         st.write("Nenhum dado disponível para gerar gráficos.")
         return
-# Verifica se o DataFrame filtrado está vazio, e, se estiver, exibe uma mensagem 
+# Verifica se a seleção está vazia, e, se estiver, exibe uma mensagem 
 # dizendo que não há dados disponíveis para gerar gráficos.
 
     
@@ -238,23 +368,17 @@ def graphs():
 # que possam ocorrer durante a execução do código. Se ocorrer um erro dentro desse bloco, 
 # ele será tratado em um bloco except correspondente (que não está visível neste trecho).
 
-        # Agregando os dados conforme a seleção
-        grouped_data = df_selection.groupby(by=[x_axis]).size().reset_index(name='contagem')
-# Agrega os dados do DataFrame df_selection com base na coluna selecionada para o eixo X (x_axis).
-# df_selection.groupby(by=[x_axis]): Agrupa os dados com base nos valores da coluna selecionada como eixo X.
-# .size(): Conta o número de ocorrências em cada grupo.
-# .reset_index(name='contagem'): Reseta o índice do DataFrame agrupado e nomeia a nova 
-# coluna com as contagens de cada grupo como "contagem"
+        # grouped_data: o eixo X agrupado em num_intervalos intervalos, com a contagem de registros de cada um
+        # (e a média de Y, usada no gráfico de linha). Tem no máximo num_intervalos linhas, independentemente
+        # do número de registros.
         fig_valores = px.bar(
-# Cria um gráfico de barras horizontais usando o Plotly Express com os dados agrupados.
+# Cria um gráfico de barras (um histograma do eixo X) usando o Plotly Express com os dados agrupados.
             grouped_data,
 # grouped_data: O DataFrame agrupado que contém os dados a serem plotados.
             x=x_axis,
-# x=x_axis: Define o eixo X do gráfico como a coluna selecionada no eixo X.
+# x=x_axis: Define o eixo X do gráfico como o centro de cada intervalo da coluna selecionada no eixo X.
             y='contagem',
 # y='contagem': Define o eixo Y do gráfico como a coluna "contagem", que contém o número de registros em cada grupo.
-            orientation='h',
-# orientation='h': Define a orientação do gráfico como horizontal.
             title=f"<b>Contagem de Registros por {x_axis.capitalize()}</b>",
 # title=f"<b>Contagem de Registros por {x_axis.capitalize()}</b>": Define o título do gráfico, com o nome da coluna do eixo X capitalizado.
             color_discrete_sequence=["#0083b8"],
@@ -287,8 +411,7 @@ def graphs():
     
     # Gráfico simples de linha
     try:
-        # Agregando os dados conforme a seleção
-        grouped_data = df_selection.groupby(by=[x_axis]).agg({y_axis: 'mean'}).reset_index()
+        # Reaproveita os intervalos calculados para o gráfico de barras (média de Y por intervalo de X)
         fig_state = px.line(
             grouped_data,
             x=x_axis,
@@ -333,4 +456,97 @@ def graphs():
 # A opção use_container_width=True faz com que o gráfico utilize a largura total da coluna onde está inserido, 
 # ajustando seu tamanho automaticamente para preencher o espaço disponível.
 
-Home()
\ No newline at end of file
+JANELA_AO_VIVO = 300
+# Quantidade de leituras mais recentes exibidas no gráfico do modo ao vivo.
+LIMITE_AO_VIVO = 10000
+# Máximo de registros novos buscados por atualização no modo ao vivo.
+
+def estado_ao_vivo():
+    chave = (tuple(sorted(faixas.items())), x_axis, y_axis)
+    estado = st.session_state.get("ao_vivo")
+    if estado is None or estado["chave"] != chave:
+        estado = {
+            "chave": chave,
+            "cursor": None,
+            "agregados": {coluna: [0, 0.0, np.inf, -np.inf] for coluna in FILTROS},
+            "janela": deque(maxlen=JANELA_AO_VIVO),
+        }
+        st.session_state["ao_vivo"] = estado
+    return estado
+# Estado do modo ao vivo guardado na sessão: o último id (ou sequência, no modo API) já lido, os agregados
+# acumulados (contagem, soma, mínimo e máximo de cada atributo) e uma janela de tamanho fixo com as
+# leituras mais recentes. Se os filtros ou os eixos mudarem, o estado recomeça do zero.
+
+def registros_novos(estado):
+    if API_URL:
+        resposta = api_latest(estado["cursor"] or 0)
+        estado["cursor"] = resposta["seq"]
+        novos = pd.DataFrame(resposta["leituras"], columns=list(FILTROS) + ["tempo_registro"])
+        novos["tempo_registro"] = pd.to_datetime(novos["tempo_registro"])
+    # Modo API: GET /data/latest?since= devolve apenas as leituras com sequência maior que a última vista.
+    else:
+        if estado["cursor"] is None:
+            novos = view_last_data(JANELA_AO_VIVO)
+        else:
+            novos = view_new_data(estado["cursor"], limite=LIMITE_AO_VIVO)
+        if not novos.empty:
+            estado["cursor"] = int(novos["id"].iloc[-1])
+    # Modo banco: na primeira vez busca as últimas JANELA_AO_VIVO leituras; depois, só id > último id lido.
+    return seleciona(novos, faixas)
+
+def atualiza_agregados(estado, novos):
+    for coluna, agregado in estado["agregados"].items():
+        valores = novos[coluna].to_numpy(dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        if len(valores):
+            agregado[0] += len(valores)
+            agregado[1] += valores.sum()
+            agregado[2] = min(agregado[2], valores.min())
+            agregado[3] = max(agregado[3], valores.max())
+    estado["janela"].extend(zip(novos["tempo_registro"], novos[y_axis]))
+# Soma apenas as leituras novas aos agregados e à janela: o custo de cada atualização depende do número
+# de leituras novas, não do histórico, e a memória usada é constante.
+
+def painel_ao_vivo():
+    estado = estado_ao_vivo()
+    novos = registros_novos(estado)
+    if not novos.empty:
+        atualiza_agregados(estado, novos)
+
+    colunas = st.columns(len(FILTROS), gap='large')
+    for coluna_layout, (coluna, (rotulo, _)) in zip(colunas, FILTROS.items()):
+        n, soma, minimo, maximo = estado["agregados"][coluna]
+        with coluna_layout:
+            st.info(rotulo, icon='📌')
+            st.metric(label=f"Média ({n} leituras)", value=f"{soma / n:.2f}" if n else "-")
+            if n:
+                st.caption(f"mín {minimo:.2f} · máx {maximo:.2f}")
+    st.markdown("""-----""")
+
+    if estado["janela"]:
+        janela = pd.DataFrame(list(estado["janela"]), columns=["tempo_registro", y_axis])
+        fig_ao_vivo = px.line(
+            janela,
+            x="tempo_registro",
+            y=y_axis,
+            title=f"<b>{y_axis.capitalize()} - últimas {len(janela)} leituras</b>",
+            color_discrete_sequence=["#0083b8"],
+            template="plotly_white"
+        )
+        fig_ao_vivo.update_layout(
+            xaxis=dict(showgrid=False),
+            plot_bgcolor="rgba(0,0,0,0)",
+            yaxis=dict(showgrid=False)
+        )
+        st.plotly_chart(fig_ao_vivo, use_container_width=True)
+    else:
+        st.write("Aguardando leituras...")
+# Desenha os indicadores acumulados desde que o modo ao vivo foi ligado e o gráfico da janela recente.
+
+if modo_ao_vivo:
+    st.fragment(run_every=intervalo_ao_vivo)(painel_ao_vivo)()
+# O fragmento é executado de novo a cada intervalo_ao_vivo segundos sem reexecutar o restante do script
+# (carga de dados, filtros e gráficos completos).
+else:
+    Home()
+    graphs()
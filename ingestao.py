@@ -0,0 +1,364 @@
+import codecs
+import json
+import logging
+import queue
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# ********************* INGESTÃO EM LOTE (WRITE-BEHIND) *********************************
+# O callback do MQTT apenas enfileira as leituras já convertidas; uma thread dedicada
+# esvazia a fila e grava no banco em lotes (INSERT de várias linhas), disparando a
+# gravação quando o lote atinge `lote_max` linhas ou quando `intervalo_ms` se esgota.
+
+_FIM = object()
+# Sentinela usada para avisar a thread gravadora que deve gravar o que restou e encerrar. Com a fila
+# cheia não há onde colocá-la: a thread vê o evento _parando e encerra quando a fila esvaziar.
+
+log = logging.getLogger("registro.ingestao")
+
+
+class FilaIngestao:
+
+    def __init__(self, grava_lote, lote_max=500, intervalo_ms=250, capacidade=10000, espera_ms=50, nome="ingestao"):
+        # grava_lote: função que recebe uma lista de dicionários e grava todos de uma vez.
+        # capacidade: tamanho máximo da fila; acima disso entra em ação a contrapressão.
+        # espera_ms: quanto tempo o produtor aceita esperar por espaço antes de descartar a leitura.
+        self.grava_lote = grava_lote
+        self.lote_max = lote_max
+        self.intervalo = intervalo_ms / 1000.0
+        self.espera = espera_ms / 1000.0
+        self.nome = nome
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._thread = None
+        self._parando = threading.Event()
+        self._lock = threading.Lock()
+        self.contadores = {
+            "recebidos": 0,   # leituras aceitas na fila
+            "overflow": 0,    # vezes em que a fila estava cheia e o produtor precisou esperar
+            "descartados": 0, # leituras descartadas porque a fila continuou cheia
+            "gravados": 0,    # linhas gravadas com sucesso
+            "falhas": 0,      # linhas perdidas em lotes que falharam
+            "lotes": 0,       # lotes gravados
+        }
+
+    def _incrementa(self, chave, valor=1):
+        with self._lock:
+            self.contadores[chave] += valor
+
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parando.clear()
+            self._thread = threading.Thread(target=self._executa, name=self.nome, daemon=True)
+            self._thread.start()
+
+    def publica(self, item):
+        # Chamado pela thread do MQTT: nunca acessa o banco, no máximo espera `espera_ms`.
+        try:
+            self._fila.put_nowait(item)
+        except queue.Full:
+            self._incrementa("overflow")
+            try:
+                self._fila.put(item, timeout=self.espera)
+            except queue.Full:
+                self._incrementa("descartados")
+                return False
+        self._incrementa("recebidos")
+        return True
+
+    def parar(self, timeout=5.0):
+        # Grava o que estiver pendente e encerra a thread gravadora.
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._avisa_parada()
+        self._thread.join(timeout)
+
+    def _avisa_parada(self):
+        # Nunca bloqueia: se a fila estiver cheia, a thread não está parada no get e vê o evento
+        self._parando.set()
+        try:
+            self._fila.put_nowait(_FIM)
+        except queue.Full:
+            pass
+
+    def status(self):
+        with self._lock:
+            status = dict(self.contadores)
+        status["fila"] = self._fila.qsize()
+        status["capacidade"] = self._fila.maxsize
+        return status
+
+    def _grava(self, lote):
+        try:
+            self.grava_lote(lote)
+            self._incrementa("gravados", len(lote))
+            self._incrementa("lotes")
+        except Exception as e:
+            log.error("Erro ao gravar lote de %d registros: %s", len(lote), e)
+            self._incrementa("falhas", len(lote))
+
+    def _executa(self):
+        lote = []
+        prazo = 0.0
+        while True:
+            if self._parando.is_set() and self._fila.empty():
+                if lote:
+                    self._grava(lote)
+                return
+            # Sem lote pendente espera indefinidamente; com lote pendente espera só até o prazo.
+            timeout = max(0.0, prazo - time.monotonic()) if lote else None
+            try:
+                item = self._fila.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _FIM:
+                if lote:
+                    self._grava(lote)
+                return
+
+            if item is not None:
+                if not lote:
+                    prazo = time.monotonic() + self.intervalo
+                lote.append(item)
+
+            if lote and (len(lote) >= self.lote_max or time.monotonic() >= prazo):
+                self._grava(lote)
+                lote = []
+
+
+# ********************* VÁRIAS FILAS PARTICIONADAS POR DISPOSITIVO *********************************
+# Cada dispositivo é sempre atendido pela mesma fila (hash estável do id), então as leituras de um
+# dispositivo são gravadas na ordem em que chegaram, enquanto dispositivos diferentes gravam em
+# paralelo. A gravação passa a maior parte do tempo esperando o banco (fora do GIL), por isso
+# várias threads gravadoras aumentam a vazão mesmo em um único processo.
+
+
+class PoolIngestao:
+
+    def __init__(self, grava_lote, trabalhadores=4, nome="ingestao", **opcoes):
+        # opcoes: lote_max, intervalo_ms, capacidade e espera_ms de cada FilaIngestao
+        self.filas = [FilaIngestao(grava_lote, nome=f"{nome}-{i}", **opcoes) for i in range(max(1, trabalhadores))]
+
+    def particao(self, chave):
+        # crc32 e não hash(): o hash de str muda a cada execução do Python
+        return zlib.crc32(str(chave or "").encode()) % len(self.filas)
+
+    def iniciar(self):
+        for fila in self.filas:
+            fila.iniciar()
+
+    def publica(self, item, chave=None):
+        return self.filas[self.particao(chave)].publica(item)
+
+    def parar(self, timeout=5.0):
+        # Avisa todas as filas antes de esperar, para que gravem o que resta em paralelo
+        ativas = [fila for fila in self.filas if fila._thread is not None and fila._thread.is_alive()]
+        for fila in ativas:
+            fila._avisa_parada()
+        for fila in ativas:
+            fila._thread.join(timeout)
+
+    def status(self):
+        por_fila = [fila.status() for fila in self.filas]
+        status = {chave: sum(item[chave] for item in por_fila) for chave in por_fila[0]}
+        status["trabalhadores"] = por_fila
+        return status
+
+
+# ********************* FILTRO DE LEITURAS REPETIDAS *********************************
+# Guarda as chaves (dispositivo, tempo) vistas mais recentemente, em um LRU de tamanho fixo.
+# Reenvios do ESP32 e entregas duplicadas do MQTT (QoS 1) chegam logo depois da original,
+# então um LRU pequeno descarta quase todas antes de chegarem ao banco; as que escaparem
+# são barradas pela chave única da tabela.
+
+
+class FiltroDuplicados:
+
+    def __init__(self, capacidade=100000):
+        self.capacidade = capacidade
+        self._chaves = OrderedDict()
+        self._lock = threading.Lock()
+        self.verificados = 0
+        self.duplicados = 0
+        self.no_banco = 0  # repetidas que passaram pelo LRU (ou vieram pela API) e foram barradas no banco
+
+    def repetido(self, chave):
+        # True se a chave já foi registrada (conta como duplicado); não registra a chave
+        with self._lock:
+            self.verificados += 1
+            if chave in self._chaves:
+                self._chaves.move_to_end(chave)
+                self.duplicados += 1
+                return True
+            return False
+
+    def registra(self, chave):
+        # Chamado depois que a leitura foi aceita (na fila ou no spool)
+        with self._lock:
+            self._chaves[chave] = None
+            self._chaves.move_to_end(chave)
+            while len(self._chaves) > self.capacidade:
+                self._chaves.popitem(last=False)
+
+    def conta_no_banco(self, quantidade):
+        with self._lock:
+            self.no_banco += quantidade
+
+    def status(self):
+        with self._lock:
+            return {"verificados": self.verificados, "duplicados": self.duplicados, "no_banco": self.no_banco,
+                    "chaves": len(self._chaves), "capacidade": self.capacidade}
+
+
+# ********************* LEITURA INCREMENTAL DE LOTES *********************************
+# Lê um corpo HTTP em pedaços e devolve um objeto por vez, sem carregar o lote inteiro
+# na memória. Aceita um array JSON (`[{...}, {...}]`) ou NDJSON (um objeto por linha).
+
+_decoder = json.JSONDecoder()
+_ESPACOS = " \t\r\n"
+_BRANCOS = re.compile(r"\s*")
+
+
+class LoteTruncado(ValueError):
+    # O corpo acabou (ou ficou ilegível) no meio de um item do array: o restante do lote não foi lido
+    pass
+
+
+def le_json_incremental(stream, tamanho_pedaco=65536):
+    # Gera (indice, objeto) para cada item; itens com JSON inválido geram (indice, ValueError).
+    buffer = ""
+    pedacos = iter(lambda: stream.read(tamanho_pedaco), b"")
+    decoder_utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    # Descobre o formato pelo primeiro caractere significativo
+    for pedaco in pedacos:
+        buffer += decoder_utf8.decode(pedaco)
+        buffer = buffer.lstrip(_ESPACOS)
+        if buffer:
+            break
+    if not buffer:
+        return
+
+    if buffer[0] == "[":
+        yield from _le_array(buffer[1:], pedacos, decoder_utf8)
+    else:
+        yield from _le_ndjson(buffer, pedacos, decoder_utf8)
+
+
+def _le_ndjson(buffer, pedacos, decoder_utf8):
+    indice = 0
+    posicao = 0
+    fim = False
+    while True:
+        quebra = buffer.find("\n", posicao)
+        if quebra < 0 and not fim:
+            # Linha incompleta: descarta o que já foi consumido e lê mais um pedaço
+            buffer = buffer[posicao:]
+            posicao = 0
+            pedaco = next(pedacos, None)
+            if pedaco is None:
+                fim = True
+                buffer += decoder_utf8.decode(b"", final=True)
+            else:
+                buffer += decoder_utf8.decode(pedaco)
+            continue
+        if quebra < 0:
+            quebra = len(buffer)
+        linha = buffer[posicao:quebra].strip()
+        posicao = quebra + 1
+        if linha:
+            try:
+                yield indice, json.loads(linha)
+            except ValueError as e:
+                yield indice, e
+            indice += 1
+        if fim and posicao >= len(buffer):
+            return
+
+
+def _le_array(buffer, pedacos, decoder_utf8, tamanho_max_item=1048576):
+    # Itens separados por exatamente uma vírgula. Um item malformado é rejeitado sozinho e a leitura
+    # continua na vírgula seguinte; se não houver como achá-la, o último item gerado é um LoteTruncado.
+    indice = 0
+    posicao = 0
+    fim = False
+    separado = True  # já veio a vírgula (ou o "[") antes do próximo item
+    while True:
+        posicao = _BRANCOS.match(buffer, posicao).end()
+        if posicao < len(buffer):
+            caractere = buffer[posicao]
+            if caractere == "]" and (separado and indice):
+                yield indice, ValueError("vírgula antes do fim do array")
+                return
+            if caractere == "]":
+                return
+            if caractere == ",":
+                if separado:
+                    yield indice, ValueError("item vazio entre vírgulas")
+                    indice += 1
+                separado = True
+                posicao += 1
+                continue
+            try:
+                objeto, final = _decoder.raw_decode(buffer, posicao)
+            except ValueError as e:
+                # Item incompleto (precisa de mais dados) ou malformado: neste caso termina na próxima
+                # vírgula ou "]" fora de strings e no nível do array
+                final = _fim_do_item(buffer, posicao)
+                if final >= 0:
+                    yield indice, e
+                    indice += 1
+                    separado = False
+                    posicao = final
+                    continue
+                if fim or len(buffer) - posicao > tamanho_max_item:
+                    yield indice, LoteTruncado(f"item {indice} ilegível; o restante do lote não foi lido ({e})")
+                    return
+            else:
+                # Um número no fim do buffer pode estar truncado; só aceita se houver algo depois
+                if final < len(buffer) or fim:
+                    yield indice, objeto if separado else ValueError("falta a vírgula antes do item")
+                    indice += 1
+                    separado = False
+                    posicao = final
+                    continue
+        elif fim:
+            return
+        buffer = buffer[posicao:]
+        posicao = 0
+        pedaco = next(pedacos, None)
+        if pedaco is None:
+            fim = True
+            buffer += decoder_utf8.decode(b"", final=True)
+        else:
+            buffer += decoder_utf8.decode(pedaco)
+
+
+def _fim_do_item(buffer, posicao):
+    # Posição da vírgula ou do "]" que encerra o item que começa em `posicao`, ou -1 se não estiver no buffer
+    nivel = 0
+    em_string = False
+    escape = False
+    for i in range(posicao, len(buffer)):
+        caractere = buffer[i]
+        if em_string:
+            if escape:
+                escape = False
+            elif caractere == "\\":
+                escape = True
+            elif caractere == '"':
+                em_string = False
+        elif caractere == '"':
+            em_string = True
+        elif caractere in "{[":
+            nivel += 1
+        elif caractere in "}]":
+            if nivel == 0 and caractere == "]":
+                return i
+            nivel = max(0, nivel - 1)
+        elif caractere == "," and nivel == 0:
+            return i
+    return -1
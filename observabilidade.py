@@ -0,0 +1,238 @@
+import bisect
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+
+# ********************* MÉTRICAS (FORMATO TEXTO DO PROMETHEUS) *********************************
+# Contadores, histogramas e medidores mantidos em memória e exportados em GET /metrics.
+# Implementação mínima do formato de exposição do Prometheus, sem dependências novas.
+
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _rotulos(nomes, valores, extra=""):
+    partes = [f'{nome}="{_escapa(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _escapa(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(rotulos.get(nome, "") for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def texto(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}")
+        return linhas
+
+
+class Histograma:
+
+    def __init__(self, nome, ajuda, baldes=BALDES_SEGUNDOS, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.baldes = tuple(sorted(baldes))
+        self.rotulos = tuple(rotulos)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observa(self, valor, **rotulos):
+        chave = tuple(rotulos.get(nome, "") for nome in self.rotulos)
+        indice = bisect.bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                # contagem por balde (não acumulada) + soma + total
+                serie = self._series[chave] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def texto(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            itens = sorted((chave, (list(serie[0]), serie[1], serie[2])) for chave, serie in self._series.items())
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += contagem
+                le = 'le="' + _numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {total}")
+        return linhas
+
+
+class Medidor:
+    # Valor lido na hora da coleta: funcao() devolve um número ou {valor do rótulo: número}
+
+    def __init__(self, nome, ajuda, funcao, rotulo=None, tipo="gauge"):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+        self.rotulo = rotulo
+        self.tipo = tipo
+
+    def texto(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        try:
+            valor = self.funcao()
+        except Exception as e:
+            logging.getLogger("registro").warning("Erro ao coletar a métrica %s: %s", self.nome, e)
+            return linhas
+        if isinstance(valor, dict):
+            for chave, numero in sorted(valor.items()):
+                linhas.append(f"{self.nome}{_rotulos([self.rotulo], [chave])} {_numero(numero)}")
+        elif valor is not None:
+            linhas.append(f"{self.nome} {_numero(valor)}")
+        return linhas
+
+
+class Metricas:
+
+    def __init__(self):
+        self._metricas = []
+
+    def _adiciona(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._adiciona(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, baldes=BALDES_SEGUNDOS, rotulos=()):
+        return self._adiciona(Histograma(nome, ajuda, baldes, rotulos))
+
+    def medidor(self, nome, ajuda, funcao, rotulo=None, tipo="gauge"):
+        return self._adiciona(Medidor(nome, ajuda, funcao, rotulo, tipo))
+
+    def texto(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas += metrica.texto()
+        return "\n".join(linhas) + "\n"
+
+
+# ********************* LOG COM NÍVEIS E AMOSTRAGEM *********************************
+# Mensagens repetidas por leitura (payload recebido, lote gravado, payload inválido) passam
+# por um filtro que deixa sair 1 a cada `taxa` ocorrências de cada mensagem; erros sempre saem.
+
+
+class FiltroAmostragem(logging.Filter):
+
+    def __init__(self, taxa=100, nivel_sempre=logging.ERROR):
+        super().__init__()
+        self.taxa = max(1, taxa)
+        self.nivel_sempre = nivel_sempre
+        self._contagens = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.nivel_sempre or self.taxa == 1:
+            return True
+        with self._lock:
+            contagem = self._contagens.get(record.msg, 0)
+            self._contagens[record.msg] = contagem + 1
+        if contagem % self.taxa:
+            return False
+        if contagem:
+            record.msg = f"{record.msg} (1 a cada {self.taxa})"
+        return True
+
+
+def configura_log(nivel="INFO", taxa_amostragem=100):
+    # Logger "registro" para a aplicação; "registro.ingestao" (por leitura) passa pela amostragem
+    logger = logging.getLogger("registro")
+    if not logger.handlers:
+        saida = logging.StreamHandler()
+        saida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(saida)
+        logger.propagate = False
+    logger.setLevel(nivel)
+    ingestao = logging.getLogger("registro.ingestao")
+    ingestao.filters = [filtro for filtro in ingestao.filters if not isinstance(filtro, FiltroAmostragem)]
+    ingestao.addFilter(FiltroAmostragem(taxa_amostragem))
+    return logger
+
+
+# ********************* PERFIL POR REQUISIÇÃO (OPCIONAL) *********************************
+# Middleware WSGI: uma requisição com ?perfil=1 roda sob o cProfile, incluindo a geração da
+# resposta em streaming; as funções mais caras vão para o log e o perfil completo (.prof,
+# para abrir com snakeviz/pstats) para `pasta`. Só é instalado quando habilitado na configuração.
+
+
+class PerfilRequisicoes:
+
+    def __init__(self, app_wsgi, pasta=None, linhas=30):
+        self.app_wsgi = app_wsgi
+        self.pasta = pasta
+        self.linhas = linhas
+        self.log = logging.getLogger("registro.perfil")
+
+    def __call__(self, environ, start_response):
+        if "perfil=1" not in environ.get("QUERY_STRING", "").split("&"):
+            return self.app_wsgi(environ, start_response)
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            resposta = self.app_wsgi(environ, start_response)
+        finally:
+            perfil.disable()
+        return self._itera(resposta, perfil, inicio, environ)
+
+    def _itera(self, resposta, perfil, inicio, environ):
+        try:
+            iterador = iter(resposta)
+            while True:
+                perfil.enable()
+                try:
+                    parte = next(iterador)
+                except StopIteration:
+                    break
+                finally:
+                    perfil.disable()
+                yield parte
+        finally:
+            if hasattr(resposta, "close"):
+                resposta.close()
+            self._registra(perfil, time.perf_counter() - inicio, environ)
+
+    def _registra(self, perfil, duracao, environ):
+        rota = f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}?{environ.get('QUERY_STRING', '')}"
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(self.linhas)
+        self.log.info("Perfil de %s (%.1f ms):\n%s", rota, duracao * 1000, texto.getvalue())
+        if self.pasta:
+            os.makedirs(self.pasta, exist_ok=True)
+            caminho = os.path.join(self.pasta, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(duracao * 1000)}ms.prof")
+            perfil.dump_stats(caminho)
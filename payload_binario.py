@@ -0,0 +1,94 @@
+import struct
+import numpy as np
+
+# ********************* PAYLOAD BINÁRIO DO ESP32 *********************************
+# Alternativa compacta ao JSON: layout fixo, little-endian, com uma ou várias leituras por mensagem.
+# Uma leitura ocupa 24 bytes (o JSON do ESP32 tem ~120) e o lote inteiro é decodificado de uma vez
+# com numpy.frombuffer, sem json.loads nem um .get por campo.
+#
+# Cabeçalho (5 bytes + id do dispositivo):
+#   magico     uint8   0xA5 (nunca é o primeiro byte de um texto UTF-8, então não se confunde com JSON)
+#   versao     uint8   versão do layout das leituras (ver VERSOES)
+#   leituras   uint16  quantidade de leituras na mensagem
+#   tamanho_id uint8   bytes do id do dispositivo que vêm a seguir (0 = id vem do tópico)
+#   id         UTF-8
+# Leitura, versão 1 (24 bytes):
+#   timestamp uint32 (epoch UTC), temperatura, pressao, altitude, umidade, co2 float32 (NaN = sem a medida)
+#
+# A mensagem é binária se começar pelo byte mágico ou se chegar em um tópico terminado em /bin.
+
+MAGICO = 0xA5
+SUFIXO_TOPICO = "/bin"
+CABECALHO = struct.Struct("<BBHB")
+MEDIDAS = ["temperatura", "pressao", "altitude", "umidade", "co2"]
+VERSOES = {
+    1: np.dtype([("timestamp", "<u4")] + [(medida, "<f4") for medida in MEDIDAS]),
+}
+VERSAO_ATUAL = 1
+
+
+class PayloadInvalido(ValueError):
+    pass
+
+
+def eh_binario(topico, payload):
+    return topico.endswith(SUFIXO_TOPICO) or (len(payload) > 0 and payload[0] == MAGICO)
+
+
+def decodifica(payload):
+    # -> (id do dispositivo ou None, array estruturado com uma linha por leitura)
+    if len(payload) < CABECALHO.size:
+        raise PayloadInvalido(f"payload binário curto demais ({len(payload)} bytes)")
+    magico, versao, quantidade, tamanho_id = CABECALHO.unpack_from(payload)
+    if magico != MAGICO:
+        raise PayloadInvalido(f"byte mágico inválido: 0x{magico:02x}")
+    formato = VERSOES.get(versao)
+    if formato is None:
+        raise PayloadInvalido(f"versão {versao} do payload binário não suportada")
+    inicio = CABECALHO.size + tamanho_id
+    esperado = inicio + quantidade * formato.itemsize
+    if not quantidade or len(payload) != esperado:
+        raise PayloadInvalido(f"tamanho {len(payload)} não confere com {quantidade} leituras da versão {versao} "
+                              f"({esperado} bytes)")
+    try:
+        dispositivo = bytes(payload[CABECALHO.size:inicio]).decode("utf-8") or None
+    except UnicodeDecodeError:
+        raise PayloadInvalido("id do dispositivo não é UTF-8")
+    return dispositivo, np.frombuffer(payload, formato, count=quantidade, offset=inicio)
+
+
+def valida(registros, faixas):
+    # Máscara das leituras aceitas e a contagem das recusadas por motivo. Uma medida NaN é ausente
+    # (vira NULL); fora de `faixas` ({medida: (mínimo, máximo)}) ou infinita, a leitura toda é recusada.
+    tempo_valido = registros["timestamp"] > 0
+    na_faixa = np.ones(len(registros), dtype=bool)
+    for medida in MEDIDAS:
+        valores = registros[medida]
+        minimo, maximo = faixas.get(medida, (-np.inf, np.inf))
+        na_faixa &= np.isnan(valores) | (np.isfinite(valores) & (valores >= minimo) & (valores <= maximo))
+    aceitas = tempo_valido & na_faixa
+    recusas = {"tempo_invalido": int((~tempo_valido).sum()), "fora_da_faixa": int((tempo_valido & ~na_faixa).sum())}
+    return aceitas, recusas
+
+
+def colunas(registros):
+    # {campo: lista} com as medidas em float (o menor decimal que representa o float32, 23.45 e não
+    # 23.450000762939453) e None no lugar de NaN
+    resultado = {"timestamp": registros["timestamp"].tolist()}
+    for medida in MEDIDAS:
+        valores = registros[medida].astype(str).astype(np.float64).tolist()
+        resultado[medida] = [None if valor != valor else valor for valor in valores]
+    return resultado
+
+
+def codifica(leituras, dispositivo=None, versao=VERSAO_ATUAL):
+    # Monta o payload a partir de dicts {"timestamp": ..., "temperatura": ..., ...} (para testes, o
+    # benchmark e publicadores em Python; o ESP32 monta os mesmos bytes com um struct em C)
+    formato = VERSOES[versao]
+    registros = np.zeros(len(leituras), dtype=formato)
+    ausentes = tuple(0 if campo == "timestamp" else np.nan for campo in formato.names)
+    for i, leitura in enumerate(leituras):
+        registros[i] = tuple(ausente if leitura.get(campo) is None else leitura[campo]
+                             for campo, ausente in zip(formato.names, ausentes))
+    id_dispositivo = (dispositivo or "").encode("utf-8")
+    return CABECALHO.pack(MAGICO, versao, len(leituras), len(id_dispositivo)) + id_dispositivo + registros.tobytes()
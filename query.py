@@ -1,28 +1,200 @@
 # pip install mysql-connector-python
 # pip install streamlit
-import mysql.connector 
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import mysql.connector
+from mysql.connector import errors, pooling
+import numpy as np
+import pandas as pd
+import requests
 import streamlit as st
+from arquivo import ArquivoParquet
 
 
 # Conexão
 
-conn = mysql.connector.connect(
-    host="http://projetointegrador-graduacao.mysql.database.azure.com/",
-    port="3306",
+DB_CONFIG = dict(
+    host="projetointegrador-graduacao.mysql.database.azure.com",
+    port=3306,
     user="jessica",
     password="senai@134",
-    db="medidor"
+    database="medidor"
     )
 
-if conn.is_connected():
-    print("Conexão bem-sucedida ao banco de dados!")
-else:
-    print("Falha na conexão ao banco de dados.")
+API_URL = os.environ.get("REGISTRO_API_URL")
+# Endereço da API (ex.: http://localhost:5000). Se definido, o dashboard pede KPIs e gráficos
+# já calculados ao servidor em vez de carregar os registros do banco.
 
-c=conn.cursor()
+ARQUIVO_PASTA = os.environ.get("REGISTRO_ARQUIVO")
+# Pasta do arquivo Parquet mantido pela API (ARQUIVO_PASTA em main.py). Se definida, o histórico
+# já arquivado é lido dos arquivos (só as colunas e dias necessários, mapeados em memória) e o
+# banco só entrega as leituras mais novas que o arquivo.
+_arquivo = ArquivoParquet(ARQUIVO_PASTA) if ARQUIVO_PASTA else None
+
+POOL_TAMANHO = 5
+# Número de conexões mantidas abertas e compartilhadas entre as sessões do Streamlit.
+BLOCO = 50000
+# Número de linhas lidas do cursor por vez ao montar as colunas.
+
+COLUNAS = ["id", "temperatura", "pressao", "altitude", "umidade", "co2", "tempo_registro"]
+TIPOS = {
+    "id": np.int64,
+    "temperatura": np.float64,
+    "pressao": np.float64,
+    "altitude": np.float64,
+    "umidade": np.float64,
+    "co2": np.float64,
+    "tempo_registro": "datetime64[us]",
+}
+# Tipo NumPy de cada coluna. As medidas são DECIMAL no banco e já vêm convertidas para
+# DOUBLE na própria consulta, sem passar por objetos Decimal do Python.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Cria o pool na primeira utilização (e não na importação do módulo)
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="dashboard", pool_size=POOL_TAMANHO, pool_reset_session=True, **DB_CONFIG
+            )
+            print("Conexão bem-sucedida ao banco de dados!")
+    return _pool
+
+
+@contextmanager
+def conexao(tentativas=10, espera=0.2):
+    # Empresta uma conexão do pool (esperando se todas estiverem em uso) e devolve ao final
+    for tentativa in range(tentativas):
+        try:
+            conn = get_pool().get_connection()
+            break
+        except errors.PoolError:
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(espera)
+    try:
+        if not conn.is_connected():
+            conn.reconnect(attempts=3, delay=1)
+        yield conn
+    finally:
+        conn.close()
+        # Em uma conexão do pool, close() apenas devolve a conexão para o pool.
+
+
+def expressao_coluna(coluna):
+    if coluna not in TIPOS:
+        raise ValueError(f"Coluna inválida: {coluna}")
+    if TIPOS[coluna] == np.float64:
+        # DECIMAL * 1e0 é DOUBLE em qualquer versão do MySQL; CAST(... AS DOUBLE) só a partir da 8.0.17
+        # (mesma conversão de coluna_float em main.py)
+        return f"{coluna} * 1e0 AS {coluna}"
+    return coluna
+
+
+def consulta_colunar(colunas, where="", params=(), ordem="id asc", limite=None):
+    # Busca apenas as colunas pedidas e devolve um DataFrame com colunas float64/datetime64,
+    # montado bloco a bloco direto em arrays NumPy.
+    sql = f"select {', '.join(expressao_coluna(coluna) for coluna in colunas)} from registro"
+    if where:
+        sql += f" where {where}"
+    sql += f" order by {ordem}"
+    if limite is not None:
+        sql += " limit %s"
+        params = tuple(params) + (limite,)
+
+    for tentativa in range(2):
+        partes = {coluna: [] for coluna in colunas}
+        try:
+            with conexao() as conn:
+                cursor = conn.cursor()
+                # Cursor próprio de cada chamada: sessões diferentes nunca compartilham cursor
+                try:
+                    cursor.execute(sql, params)
+                    while True:
+                        linhas = cursor.fetchmany(BLOCO)
+                        if not linhas:
+                            break
+                        for coluna, valores in zip(colunas, zip(*linhas)):
+                            partes[coluna].append(np.array(valores, dtype=TIPOS[coluna]))
+                finally:
+                    cursor.close()
+            break
+        except (errors.OperationalError, errors.InterfaceError) as e:
+            # A conexão caiu no meio da consulta: tenta mais uma vez com outra conexão
+            if tentativa == 1:
+                raise
+            print(f"Conexão perdida, tentando novamente: {e}")
+
+    return pd.DataFrame({
+        coluna: np.concatenate(partes[coluna]) if partes[coluna] else np.empty(0, dtype=TIPOS[coluna])
+        for coluna in colunas
+    })
 
 # fetch
-def view_all_data():
-    c.execute('select * from registro order by id asc')
-    data=c.fetchall()
-    return data
\ No newline at end of file
+def view_all_data(colunas=COLUNAS):
+    return consulta_colunar(colunas)
+
+# Apenas os registros com id maior que o último já carregado
+def view_new_data(ultimo_id, colunas=COLUNAS, limite=None):
+    return consulta_colunar(colunas, "id > %s", (ultimo_id,), limite=limite)
+
+# Os últimos `quantidade` registros, em ordem crescente de id
+def view_last_data(quantidade, colunas=COLUNAS):
+    if _arquivo is None:
+        df = consulta_colunar(colunas, ordem="id desc", limite=quantidade)
+        return df.iloc[::-1].reset_index(drop=True)
+    # Do banco só o que ainda não foi arquivado; o restante vem do arquivo Parquet, até o mesmo
+    # ultimo_id (o arquivamento pode avançar entre as duas leituras)
+    ultimo_id = _arquivo.estado()["ultimo_id"]
+    recentes = consulta_colunar(colunas, "id > %s", (ultimo_id,), ordem="id desc", limite=quantidade).iloc[::-1]
+    if len(recentes) < quantidade:
+        historico = dataframe_arrow(_arquivo.ultimos(quantidade - len(recentes), colunas, ate_id=ultimo_id), colunas)
+        recentes = pd.concat([historico, recentes])
+    return recentes.reset_index(drop=True)
+
+# Os registros de [inicio, fim) (epoch em segundos), lidos do arquivo Parquet e completados pelo banco
+def view_history(inicio, fim, colunas=COLUNAS):
+    condicao = "tempo_registro >= %s and tempo_registro < %s"
+    parametros = (datetime.fromtimestamp(inicio, tz=timezone.utc).replace(tzinfo=None),
+                  datetime.fromtimestamp(fim, tz=timezone.utc).replace(tzinfo=None))
+    if _arquivo is None:
+        return consulta_colunar(colunas, condicao, parametros)
+    ultimo_id = _arquivo.estado()["ultimo_id"]
+    historico = dataframe_arrow(_arquivo.le(colunas, inicio, fim, ate_id=ultimo_id), colunas)
+    recentes = consulta_colunar(colunas, "id > %s and " + condicao, (ultimo_id,) + parametros)
+    return pd.concat([historico, recentes], ignore_index=True)
+
+def dataframe_arrow(tabela, colunas):
+    # pyarrow.Table -> DataFrame com os mesmos tipos de consulta_colunar (medidas nulas viram NaN)
+    return pd.DataFrame({coluna: tabela.column(coluna).to_numpy(zero_copy_only=False).astype(TIPOS[coluna], copy=False)
+                         for coluna in colunas})
+
+
+# API: estatísticas e histogramas calculados no servidor
+
+def texto_filtros(faixas):
+    # {"temperatura": (20.0, 30.0)} -> "temperatura:20.0:30.0"
+    return ",".join(f"{coluna}:{minimo}:{maximo}" for coluna, (minimo, maximo) in (faixas or {}).items())
+
+def api_stats(faixas=None):
+    resposta = requests.get(f"{API_URL}/registro/stats", params={"filters": texto_filtros(faixas)}, timeout=30)
+    resposta.raise_for_status()
+    return resposta.json()["registro"]
+
+def api_histogram(x, y, bins, faixas=None):
+    params = {"x": x, "y": y, "bins": bins, "filters": texto_filtros(faixas)}
+    resposta = requests.get(f"{API_URL}/registro/histogram", params=params, timeout=30)
+    resposta.raise_for_status()
+    return resposta.json()["registro"]
+
+def api_latest(since):
+    resposta = requests.get(f"{API_URL}/data/latest", params={"since": since}, timeout=10)
+    resposta.raise_for_status()
+    return resposta.json()
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+# ********************* RETENÇÃO E COMPACTAÇÃO *********************************
+# Funções auxiliares das políticas de retenção (quanto tempo cada dado é mantido) e a thread
+# que executa a compactação periodicamente. O acesso ao banco fica em main.py; aqui só o cálculo
+# dos cortes e o agendamento.
+#
+# A compactação trabalha em dias inteiros (UTC): antes de apagar as leituras brutas de um dia,
+# os agregados desse dia são recalculados a partir delas e o dia é marcado como compactado;
+# a partir daí os agregados do dia passam a ser a única fonte e nunca mais são recalculados.
+
+DIA = 86400
+
+
+def inicio_do_dia(segundos):
+    return int(segundos) - int(segundos) % DIA
+
+
+def corte(dias, agora=None):
+    # Início do dia mais recente cujas leituras já passaram de `dias` dias; None = sem limite
+    if dias is None:
+        return None
+    agora = time.time() if agora is None else agora
+    return inicio_do_dia(agora - float(dias) * DIA)
+
+
+def dias_do_intervalo(inicio, fim):
+    # Inícios dos dias (epoch) que têm alguma parte em [inicio, fim)
+    dia = inicio_do_dia(inicio)
+    while dia < fim:
+        yield dia
+        dia += DIA
+
+
+def dias_brutos(dispositivo, padrao, por_dispositivo):
+    # Dias de retenção das leituras brutas de um dispositivo: a exceção configurada para ele
+    # (que pode ser None, manter tudo) ou o padrão. Leituras sem dispositivo usam a chave "".
+    if dispositivo in por_dispositivo:
+        return por_dispositivo[dispositivo]
+    return padrao
+
+
+def politica_ativa(padrao, por_dispositivo, por_medida, agregados):
+    return (padrao is not None or any(dias is not None for dias in por_dispositivo.values())
+            or any(dias is not None for dias in por_medida.values())
+            or any(dias is not None for dias in agregados.values()))
+
+
+class TarefaPeriodica:
+    # Executa `funcao(parar)` a cada `intervalo_s` segundos em uma thread própria. `parar` é um
+    # threading.Event que a função deve consultar entre blocos de trabalho para encerrar cedo.
+
+    def __init__(self, funcao, intervalo_s=3600, atraso_inicial_s=60, nome="tarefa"):
+        self.funcao = funcao
+        self.intervalo = intervalo_s
+        self.atraso_inicial = atraso_inicial_s
+        self.nome = nome
+        self.log = logging.getLogger("registro")
+        self._parando = threading.Event()
+        self._agora = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.execucoes = 0
+        self.falhas = 0
+        self.executando = False
+        self.ultima_execucao = None
+        self.ultima_duracao_s = None
+        self.ultimo_resultado = None
+        self.ultimo_erro = None
+
+    def iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parando.clear()
+        self._thread = threading.Thread(target=self._executa, name=self.nome, daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=10.0):
+        self._parando.set()
+        self._agora.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def executa_agora(self):
+        # Antecipa a próxima execução (sem esperar o intervalo)
+        self._agora.set()
+
+    def _executa(self):
+        espera = self.atraso_inicial
+        while not self._parando.is_set():
+            self._agora.wait(espera)
+            self._agora.clear()
+            if self._parando.is_set():
+                break
+            espera = self.intervalo
+            with self._lock:
+                self.executando = True
+            inicio = time.monotonic()
+            try:
+                resultado = self.funcao(self._parando)
+                erro = None
+            except Exception as e:
+                resultado = None
+                erro = f"{e.__class__.__name__}: {e}"
+                self.log.exception("Erro na tarefa %s", self.nome)
+            with self._lock:
+                self.executando = False
+                self.execucoes += 1
+                self.falhas += erro is not None
+                self.ultima_execucao = time.time()
+                self.ultima_duracao_s = round(time.monotonic() - inicio, 3)
+                self.ultimo_resultado = resultado
+                self.ultimo_erro = erro
+
+    def status(self):
+        with self._lock:
+            return {"ativa": self._thread is not None and self._thread.is_alive(), "executando": self.executando,
+                    "intervalo_s": self.intervalo, "execucoes": self.execucoes, "falhas": self.falhas,
+                    "ultima_execucao": self.ultima_execucao, "ultima_duracao_s": self.ultima_duracao_s,
+                    "ultimo_resultado": self.ultimo_resultado, "ultimo_erro": self.ultimo_erro}
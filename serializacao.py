@@ -0,0 +1,58 @@
+import json
+import numpy as np
+
+# ********************* SERIALIZAÇÃO EM BLOCO *********************************
+# Converte blocos de tuplas vindas direto do cursor (sem criar objetos Registro) em JSON.
+# As datas de um bloco inteiro são formatadas de uma vez com NumPy, em vez de um strftime por linha,
+# e cada bloco é codificado em uma única chamada ao json.dumps.
+
+FORMATOS_TEMPO = ["texto", "iso", "epoch"]
+# texto: "2024-01-31 12:00:00" (formato histórico da API), iso: "2024-01-31T12:00:00", epoch: segundos (inteiro)
+
+
+def formata_tempos(valores, formato="texto"):
+    datas = np.array(valores, dtype="datetime64[s]")
+    nulos = np.isnat(datas)
+    if formato == "epoch":
+        convertidos = datas.astype(np.int64).tolist()
+    else:
+        convertidos = np.datetime_as_string(datas, unit="s")
+        if formato == "texto":
+            convertidos = np.char.replace(convertidos, "T", " ")
+        convertidos = convertidos.tolist()
+    if nulos.any():
+        for i in np.flatnonzero(nulos).tolist():
+            convertidos[i] = None
+    return convertidos
+
+
+def colunas_do_bloco(nomes, linhas, formato_tempo="texto"):
+    # Transpõe as tuplas em listas por coluna: {"id": [...], "temperatura": [...], ...}
+    colunas = dict(zip(nomes, (list(valores) for valores in zip(*linhas)))) if linhas else {nome: [] for nome in nomes}
+    if "tempo_registro" in colunas and colunas["tempo_registro"]:
+        colunas["tempo_registro"] = formata_tempos(colunas["tempo_registro"], formato_tempo)
+    return colunas
+
+
+def junta_colunas(nomes, blocos):
+    # Concatena vários blocos colunares em um só
+    colunas = {nome: [] for nome in nomes}
+    for bloco in blocos:
+        for nome in nomes:
+            colunas[nome].extend(bloco[nome])
+    return colunas
+
+
+def objetos(nomes, colunas):
+    # Volta para o formato por linha: [{"id": 1, "temperatura": ...}, ...]
+    return [dict(zip(nomes, valores)) for valores in zip(*(colunas[nome] for nome in nomes))]
+
+
+def linhas_json(nomes, colunas):
+    # Objetos JSON de cada linha separados por ", " (sem os colchetes), codificados em uma chamada só
+    return json.dumps(objetos(nomes, colunas))[1:-1]
+
+
+def linhas_ndjson(nomes, colunas):
+    # Um objeto JSON por linha, já terminado em "\n"
+    return "".join(json.dumps(objeto) + "\n" for objeto in objetos(nomes, colunas))
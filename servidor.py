@@ -0,0 +1,118 @@
+# Modo de produção: serve a mesma aplicação de main.py pelo waitress (servidor WSGI com um pool
+# de threads, funciona no Windows e no Linux) em vez do servidor de desenvolvimento do Flask.
+#
+#   python servidor.py                                   # API + ingestão MQTT no mesmo processo
+#   python servidor.py --papel api --porta 5000          # só a API (pode haver vários processos)
+#   python servidor.py --papel ingestor --porta 5001     # só a ingestão MQTT (+ retenção e arquivo)
+#
+# Cada requisição ocupa uma thread do pool (SERVIDOR_THREADS) e uma conexão do pool do banco
+# (BANCO_POOL_*), então uma consulta lenta não segura as outras. A ingestão tem threads e sessões
+# próprias; com --papel api / ingestor em processos separados, leitores da API nem disputam o GIL
+# com a gravação das leituras.
+#
+# Só um processo assina o MQTT, não importa quantos estejam rodando: quem assina segura uma trava
+# de arquivo (SERVIDOR_TRAVA_MQTT). Com --papel tudo, os processos que não conseguiram a trava servem
+# só a API e tentam de novo a cada --espera-trava segundos, assumindo a ingestão se o dono cair.
+#
+# /data/latest, /data/stream e /analise/* vêm da memória de quem assina o MQTT: num arranjo com
+# processos --papel api, encaminhe essas rotas (no proxy reverso) para o processo ingestor.
+# Conexões SSE (/data/stream) ocupam uma thread cada enquanto estiverem abertas.
+import argparse
+import os
+import threading
+import time
+from waitress import serve
+
+import main
+from main import app, atualiza_esquema, inicia_arquivo, inicia_retencao, log, start_mqtt
+
+PAPEIS = ["tudo", "api", "ingestor"]
+
+
+class TravaArquivo:
+    # Trava exclusiva entre processos da mesma máquina (flock no Linux, msvcrt no Windows).
+    # É liberada pelo sistema quando o processo termina, mesmo se ele cair.
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = None
+
+    def adquire(self):
+        # Não bloqueia: devolve False se outro processo já tem a trava
+        if self._arquivo is not None:
+            return True
+        arquivo = open(self.caminho, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return False
+        arquivo.seek(0)
+        arquivo.truncate()
+        arquivo.write(str(os.getpid()))
+        arquivo.flush()
+        self._arquivo = arquivo
+        return True
+
+
+def inicia_ingestao():
+    start_mqtt()
+    inicia_retencao()
+    inicia_arquivo()
+    log.info("Este processo (pid %d) assina o MQTT", os.getpid())
+
+
+def vigia_trava(trava, intervalo):
+    # Processo reserva: assume a ingestão quando o processo que assina o MQTT terminar
+    while True:
+        time.sleep(intervalo)
+        if trava.adquire():
+            inicia_ingestao()
+            return
+
+
+def principal():
+    parser = argparse.ArgumentParser(description="Servidor de produção da API de registro")
+    parser.add_argument("--papel", choices=PAPEIS, default="tudo",
+                        help="tudo: API + MQTT; api: só a API; ingestor: só o MQTT (e as rotas de status)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=app.config['SERVIDOR_THREADS'],
+                        help="Requisições atendidas ao mesmo tempo")
+    parser.add_argument("--conexoes", type=int, default=app.config['SERVIDOR_CONEXOES_MAX'],
+                        help="Conexões HTTP abertas ao mesmo tempo (as excedentes esperam na fila do sistema)")
+    parser.add_argument("--trava", default=app.config['SERVIDOR_TRAVA_MQTT'],
+                        help="Arquivo de trava que garante um único assinante do MQTT")
+    parser.add_argument("--espera-trava", type=float, default=10.0,
+                        help="Intervalo (s) entre tentativas de assumir a ingestão (--papel tudo)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        atualiza_esquema()
+
+    if args.papel != "api":
+        trava = TravaArquivo(args.trava)
+        if trava.adquire():
+            inicia_ingestao()
+        elif args.papel == "ingestor":
+            parser.exit(1, f"Outro processo já assina o MQTT (trava {args.trava})\n")
+        else:
+            log.info("Outro processo já assina o MQTT; servindo só a API")
+            threading.Thread(target=vigia_trava, args=(trava, args.espera_trava), name="vigia-trava", daemon=True).start()
+    # Qualquer outro processo (inclusive os --papel tudo sem a trava, que aceitam POST e DELETE) pode
+    # gravar sem que o cache deste fique sabendo: só segura as respostas, e o ETag (304), por pouco tempo
+    main.cache_respostas.ttl = min(main.cache_respostas.ttl, app.config['SERVIDOR_CACHE_TTL_API_S'])
+
+    log.info("Servindo em %s:%d (papel %s, %d threads)", args.host, args.porta, args.papel, args.threads)
+    serve(app, host=args.host, port=args.porta, threads=args.threads, connection_limit=args.conexoes,
+          ident="registro")
+
+
+if __name__ == "__main__":
+    principal()
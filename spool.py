@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+# ********************* SPOOL LOCAL DE INGESTÃO *********************************
+# Cada leitura convertida é primeiro gravada em um arquivo SQLite local (modo WAL) e só então
+# considerada recebida. Threads reprodutoras leem o spool em lotes, gravam no banco principal
+# e apagam do spool o que foi confirmado. Se o banco estiver lento ou fora do ar, as leituras
+# esperam no disco (e sobrevivem a um reinício do processo) em vez de se perderem ou travarem o MQTT.
+#
+# As leituras são divididas em partições pelo dispositivo (crc32 do id, como em PoolIngestao):
+# cada partição tem sua própria thread reprodutora e é gravada em ordem de chegada.
+
+_ESQUEMA = """
+create table if not exists spool (
+    seq integer primary key autoincrement,
+    chave integer not null,
+    particao integer not null,
+    criado real not null,
+    dados text not null
+);
+create index if not exists spool_particao on spool (particao, seq);
+create index if not exists spool_criado on spool (criado);
+create table if not exists rejeitados (
+    seq integer primary key,
+    chave integer not null,
+    criado real not null,
+    dados text not null,
+    erro text
+);
+"""
+# chave: crc32 do dispositivo; particao = chave % número de partições (recalculada se esse número mudar).
+# spool_criado: status() pede a leitura mais antiga a cada coleta de métricas; sem o índice seria uma varredura
+# do spool inteiro, que cresce justamente quando o banco está fora do ar.
+# rejeitados: leituras que o banco recusou mesmo sozinhas (ficam guardadas, fora da fila; ver reenvia_rejeitados).
+
+log = logging.getLogger("registro.ingestao")
+
+
+def _codifica(item):
+    # Datas viram epoch e seus nomes vão em "_datas", para voltarem como datetime na leitura
+    dados = dict(item)
+    datas = [chave for chave, valor in dados.items() if isinstance(valor, datetime)]
+    for chave in datas:
+        dados[chave] = dados[chave].timestamp()
+    if datas:
+        dados["_datas"] = datas
+    return json.dumps(dados)
+
+
+def _decodifica(texto):
+    dados = json.loads(texto)
+    for chave in dados.pop("_datas", []):
+        dados[chave] = datetime.fromtimestamp(dados[chave], tz=timezone.utc)
+    return dados
+
+
+class SpoolIngestao:
+
+    def __init__(self, caminho, grava_lote, trabalhadores=4, lote_max=500, intervalo_ms=250,
+                 max_bytes=512 * 1024 * 1024, espera_max_s=30.0, nome="spool", banco_indisponivel=None):
+        # grava_lote: função que recebe uma lista de dicionários e grava todos de uma vez (ou lança exceção).
+        # max_bytes: tamanho máximo do arquivo do spool (+ WAL); acima disso novas leituras são descartadas.
+        # espera_max_s: intervalo máximo entre tentativas enquanto o banco estiver falhando.
+        # banco_indisponivel: função que diz se uma exceção de grava_lote é do banco (conexão, servidor fora
+        # do ar) e não da leitura; nesse caso a gravação uma a uma para e o resto fica no spool.
+        self.caminho = caminho
+        self.grava_lote = grava_lote
+        self.particoes = max(1, trabalhadores)
+        self.lote_max = lote_max
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.espera_max = espera_max_s
+        self.banco_indisponivel = banco_indisponivel
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._parando = threading.Event()
+        self._avisos = [threading.Event() for _ in range(self.particoes)]
+        self._threads = []
+        self._tamanho = 0
+        self._tamanho_em = 0.0
+
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        self._conexao = self._conecta()
+        self._conexao.executescript(_ESQUEMA)
+        # Se o número de partições mudou desde a última execução, redistribui o que ficou no spool
+        self._conexao.execute("update spool set particao = chave % ? where particao != chave % ?",
+                              (self.particoes, self.particoes))
+        self._pendentes = [0] * self.particoes
+        for particao, quantidade in self._conexao.execute("select particao, count(*) from spool group by particao"):
+            self._pendentes[particao] += quantidade
+        self._atualiza_tamanho()
+        self.contadores = {
+            "recebidos": 0,    # leituras gravadas no spool
+            "descartados": 0,  # leituras recusadas porque o spool atingiu max_bytes
+            "gravados": 0,     # leituras confirmadas no banco e apagadas do spool
+            "falhas": 0,       # tentativas de gravação de lote que falharam (o lote continua no spool)
+            "rejeitados": 0,   # leituras recusadas pelo banco e movidas para a tabela rejeitados
+            "lotes": 0,        # lotes gravados
+            "recuperados": sum(self._pendentes),  # leituras encontradas no spool ao iniciar
+        }
+
+    def _conecta(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        if conexao.execute("pragma auto_vacuum").fetchone()[0] != 2:
+            # auto_vacuum só muda em um arquivo vazio (ou com VACUUM); permite devolver espaço ao disco
+            conexao.execute("pragma auto_vacuum = incremental")
+            conexao.execute("vacuum")
+        conexao.execute("pragma journal_mode = wal")
+        conexao.execute("pragma synchronous = normal")
+        # synchronous=normal em WAL: um commit sobrevive à queda do processo; numa queda de energia
+        # podem se perder só os últimos commits, nunca corromper o arquivo.
+        return conexao
+
+    def _incrementa(self, chave, valor=1):
+        with self._lock:
+            self.contadores[chave] += valor
+
+    def _atualiza_tamanho(self):
+        tamanho = 0
+        for arquivo in (self.caminho, self.caminho + "-wal"):
+            try:
+                tamanho += os.path.getsize(arquivo)
+            except OSError:
+                pass
+        self._tamanho = tamanho
+        self._tamanho_em = time.monotonic()
+
+    def particao(self, chave):
+        return zlib.crc32(str(chave or "").encode()) % self.particoes
+
+    def iniciar(self):
+        if self._threads and any(thread.is_alive() for thread in self._threads):
+            return
+        self._parando.clear()
+        self._threads = [threading.Thread(target=self._executa, args=(i,), name=f"{self.nome}-{i}", daemon=True)
+                         for i in range(self.particoes)]
+        for thread in self._threads:
+            thread.start()
+
+    def publica(self, item, chave=None):
+        # Chamado pela thread do MQTT: um INSERT e um commit no arquivo local, sem acessar o banco principal
+        if time.monotonic() - self._tamanho_em > 1.0:
+            self._atualiza_tamanho()
+        if self._tamanho >= self.max_bytes:
+            self._incrementa("descartados")
+            return False
+        hash_chave = zlib.crc32(str(chave or "").encode())
+        particao = hash_chave % self.particoes
+        with self._lock:
+            self._conexao.execute("insert into spool (chave, particao, criado, dados) values (?, ?, ?, ?)",
+                                  (hash_chave, particao, time.time(), _codifica(item)))
+            self.contadores["recebidos"] += 1
+            self._pendentes[particao] += 1
+            # Acorda a reprodutora na primeira leitura (para começar a contar o intervalo) e quando o lote enche
+            avisa = self._pendentes[particao] in (1, self.lote_max)
+        if avisa:
+            self._avisos[particao].set()
+        return True
+
+    def parar(self, timeout=5.0):
+        # As leituras ainda no spool ficam no disco e são gravadas na próxima execução
+        self._parando.set()
+        for aviso in self._avisos:
+            aviso.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def status(self):
+        self._atualiza_tamanho()
+        with self._lock:
+            status = dict(self.contadores)
+            pendentes = list(self._pendentes)
+            antigo = self._conexao.execute("select min(criado) from spool").fetchone()[0]
+            status["rejeitados_guardados"] = self._conexao.execute("select count(*) from rejeitados").fetchone()[0]
+        status["fila"] = sum(pendentes)
+        status["pendentes"] = pendentes
+        status["atraso_s"] = round(time.time() - antigo, 3) if antigo is not None else 0.0
+        status["bytes"] = self._tamanho
+        status["max_bytes"] = self.max_bytes
+        return status
+
+    def _executa(self, particao):
+        conexao = self._conecta()
+        aviso = self._avisos[particao]
+        espera = 0.0
+        while not self._parando.is_set():
+            linhas = conexao.execute(
+                "select seq, criado, dados from spool where particao = ? order by seq limit ?",
+                (particao, self.lote_max)
+            ).fetchall()
+            if not linhas:
+                aviso.wait()
+                aviso.clear()
+                continue
+            if len(linhas) < self.lote_max:
+                # Lote incompleto: espera até `intervalo` desde a leitura mais antiga, ou até encher
+                restante = linhas[0][1] + self.intervalo - time.time()
+                if restante > 0 and not self._parando.is_set():
+                    aviso.clear()
+                    aviso.wait(restante)
+                    continue
+
+            if self._grava(conexao, particao, linhas):
+                espera = 0.0
+            else:
+                # Banco indisponível: tenta de novo com espera crescente, sem perder o lote
+                espera = min(self.espera_max, max(0.5, espera * 2))
+                self._parando.wait(espera)
+        conexao.close()
+
+    def _grava(self, conexao, particao, linhas):
+        try:
+            self.grava_lote([_decodifica(dados) for _, _, dados in linhas])
+        except Exception as e:
+            self._incrementa("falhas")
+            log.error("Erro ao gravar lote de %d registros do spool: %s", len(linhas), e)
+            if self._indisponivel(e, len(linhas) == 1):
+                return False
+            # Alguma leitura do lote é recusada pelo banco: grava uma a uma e separa as recusadas.
+            # Se o banco cair no meio, a leitura não tem culpa: ela e as seguintes ficam no spool.
+            for posicao, linha in enumerate(linhas):
+                try:
+                    self.grava_lote([_decodifica(linha[2])])
+                except Exception as erro:
+                    if self._indisponivel(erro, posicao == 0):
+                        self._incrementa("falhas")
+                        log.error("Erro ao gravar leitura %d do spool: %s", linha[0], erro)
+                        return False
+                    self._rejeita(conexao, particao, linha, erro)
+                    continue
+                self._confirma(conexao, particao, [linha])
+            return True
+        self._confirma(conexao, particao, linhas)
+        return True
+
+    def _indisponivel(self, erro, primeira):
+        # Sem banco_indisponivel não há como separar os erros: a primeira leitura do lote falhar
+        # sozinha é tratada como banco fora do ar (tudo fica no spool)
+        if self.banco_indisponivel is None:
+            return primeira
+        return self.banco_indisponivel(erro)
+
+    def _rejeita(self, conexao, particao, linha, erro):
+        log.error("Leitura %d do spool recusada pelo banco: %s", linha[0], erro)
+        conexao.execute("begin")
+        conexao.execute("insert into rejeitados (seq, chave, criado, dados, erro) "
+                        "select seq, chave, criado, dados, ? from spool where seq = ?", (str(erro)[:500], linha[0]))
+        conexao.execute("delete from spool where seq = ?", (linha[0],))
+        conexao.execute("commit")
+        with self._lock:
+            self._pendentes[particao] -= 1
+            self.contadores["rejeitados"] += 1
+
+    def reenvia_rejeitados(self):
+        # Devolve as leituras rejeitadas para o fim da fila (por exemplo, depois de corrigir o esquema do banco)
+        with self._lock:
+            self._conexao.execute("begin")
+            quantidade = self._conexao.execute(
+                "insert into spool (chave, particao, criado, dados) "
+                "select chave, chave % ?, criado, dados from rejeitados order by seq", (self.particoes,)
+            ).rowcount
+            self._conexao.execute("delete from rejeitados")
+            self._conexao.execute("commit")
+            self._pendentes = [0] * self.particoes
+            for particao, total in self._conexao.execute("select particao, count(*) from spool group by particao"):
+                self._pendentes[particao] += total
+        for aviso in self._avisos:
+            aviso.set()
+        return quantidade
+
+    def _confirma(self, conexao, particao, linhas):
+        # Apaga do spool o que já está no banco; o espaço livre volta ao disco aos poucos
+        conexao.execute("delete from spool where particao = ? and seq <= ?", (particao, linhas[-1][0]))
+        with self._lock:
+            self._pendentes[particao] -= len(linhas)
+            self.contadores["gravados"] += len(linhas)
+            self.contadores["lotes"] += 1
+            vazio = sum(self._pendentes) == 0
+        conexao.execute("pragma incremental_vacuum(1000)")
+        if vazio:
+            # Spool vazio: zera o WAL para o arquivo não crescer indefinidamente
+            conexao.execute("pragma wal_checkpoint(truncate)")
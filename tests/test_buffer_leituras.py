@@ -0,0 +1,22 @@
+from buffer_leituras import BufferCircular
+
+
+def test_leitor_acompanha_o_buffer():
+    buffer = BufferCircular(3)
+    for leitura in "abcd":
+        buffer.publica(leitura)
+    itens, seq, perdidos, reiniciado = buffer.desde(0)
+    assert [item for _, item in itens] == ["b", "c", "d"]
+    assert (seq, perdidos, reiniciado) == (4, 1, False)
+    assert buffer.desde(4) == ([], 4, 0, False)
+
+
+def test_cursor_de_antes_do_reinicio_recomeca_do_buffer():
+    buffer = BufferCircular(10)
+    buffer.publica("a")
+    buffer.publica("b")
+    assert buffer.espera(5000, timeout=0)
+    itens, seq, perdidos, reiniciado = buffer.desde(5000)
+    assert [item for _, item in itens] == ["a", "b"]
+    assert (seq, perdidos, reiniciado) == (2, 0, True)
+    assert not buffer.espera(seq, timeout=0)
@@ -0,0 +1,20 @@
+import time
+from cache_http import CacheRespostas
+
+
+def test_etag_muda_com_gravacao_e_com_o_tempo_de_vida():
+    cache = CacheRespostas(ttl_s=0.2)
+    etag = cache.etag("/registro")
+    cache.invalida()
+    assert cache.etag("/registro") != etag
+    etag = cache.etag("/registro")
+    time.sleep(0.25)
+    assert cache.etag("/registro") != etag
+
+
+def test_corpo_guardado_expira_com_o_tempo_de_vida():
+    cache = CacheRespostas(ttl_s=0.1)
+    cache.guarda("/registro", cache.versao, (b"{}", 200, "application/json"))
+    assert cache.obtem("/registro") == (b"{}", 200, "application/json")
+    time.sleep(0.15)
+    assert cache.obtem("/registro") is None
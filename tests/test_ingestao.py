@@ -0,0 +1,54 @@
+import io
+import pytest
+from ingestao import LoteTruncado, le_json_incremental
+
+
+def itens(corpo, tamanho_pedaco=65536):
+    return [(indice, type(item) if isinstance(item, Exception) else item)
+            for indice, item in le_json_incremental(io.BytesIO(corpo.encode()), tamanho_pedaco)]
+
+
+@pytest.mark.parametrize("tamanho_pedaco", [1, 7, 65536])
+def test_item_malformado_no_meio_nao_interrompe_o_array(tamanho_pedaco):
+    resultado = itens('[{"a": 1}, {"b": }, {"c": "x,]"}, {"d": 4}]', tamanho_pedaco)
+    assert [indice for indice, _ in resultado] == [0, 1, 2, 3]
+    assert resultado[0][1] == {"a": 1}
+    assert issubclass(resultado[1][1], ValueError)
+    assert resultado[2][1] == {"c": "x,]"}
+    assert resultado[3][1] == {"d": 4}
+
+
+def test_separador_exige_uma_virgula():
+    assert [type(item) for _, item in itens('[1,,2]')] == [int, type, int]
+    assert issubclass(itens('[1 2]')[1][1], ValueError)
+
+
+def test_item_sem_fim_trunca_o_lote():
+    resultado = itens('[{"a": 1}, {"b": "sem fim')
+    assert resultado[0] == (0, {"a": 1})
+    assert resultado[1] == (1, LoteTruncado)
+
+
+def test_parar_com_a_fila_cheia_nao_trava():
+    import threading
+    import time
+    from ingestao import FilaIngestao
+
+    liberado = threading.Event()
+    gravadas = []
+
+    def grava_lote(lote):
+        liberado.wait(5)
+        gravadas.extend(lote)
+
+    fila = FilaIngestao(grava_lote, lote_max=1, intervalo_ms=1, capacidade=2, espera_ms=1)
+    fila.iniciar()
+    for item in range(4):
+        fila.publica(item)
+    inicio = time.monotonic()
+    fila.parar(timeout=0.2)
+    assert time.monotonic() - inicio < 1
+    liberado.set()
+    fila._thread.join(5)
+    assert not fila._thread.is_alive()
+    assert gravadas == list(range(len(gravadas)))
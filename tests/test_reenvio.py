@@ -0,0 +1,44 @@
+import os
+import tempfile
+import pytest
+
+_pasta = tempfile.mkdtemp()
+os.environ.setdefault("REGISTRO_DATABASE_URI", f"sqlite:///{os.path.join(_pasta, 'registro.db')}")
+os.environ.setdefault("REGISTRO_ARQUIVO", "")
+os.environ.setdefault("REGISTRO_SPOOL", "")
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def cliente():
+    with main.app.app_context():
+        main.mybd.drop_all()
+        main.atualiza_esquema()
+    return main.app.test_client()
+
+
+def contagem(cliente):
+    return cliente.get('/registro/stats').json['registro']['contagem']
+
+
+def test_reenvio_sem_dispositivo_em_post_data(cliente):
+    leitura = {"temperatura": 21.5, "tempo_registro": 1704067200}
+    assert cliente.post('/data', json=leitura).status_code == 201
+    resposta = cliente.post('/data', json=leitura)
+    assert resposta.status_code == 200
+    with main.app.app_context():
+        assert main.mybd.session.query(main.Registro).count() == 1
+    assert contagem(cliente) == 1
+
+
+def test_reenvio_sem_dispositivo_em_post_data_batch(cliente):
+    lote = [{"temperatura": 20 + i, "tempo_registro": 1704067200 + 60 * i} for i in range(3)]
+    assert cliente.post('/data/batch', json=lote).json['aceitos'] == 3
+    resposta = cliente.post('/data/batch', json=lote)
+    assert resposta.status_code == 200
+    assert resposta.json['aceitos'] == 0
+    assert resposta.json['duplicados'] == 3
+    with main.app.app_context():
+        assert main.mybd.session.query(main.Registro).count() == 3
+    assert contagem(cliente) == 3
@@ -0,0 +1,54 @@
+import time
+from spool import SpoolIngestao
+
+
+def espera_fila_vazia(spool, limite_s=5.0):
+    fim = time.monotonic() + limite_s
+    while spool.status()["fila"] and time.monotonic() < fim:
+        time.sleep(0.02)
+    return spool.status()
+
+
+def cria_spool(tmp_path, grava_lote):
+    return SpoolIngestao(str(tmp_path / "spool.db"), grava_lote, trabalhadores=1, intervalo_ms=10,
+                         espera_max_s=0.05, banco_indisponivel=lambda erro: isinstance(erro, ConnectionError))
+
+
+def test_primeira_leitura_recusada_vai_para_rejeitados(tmp_path):
+    gravadas = []
+
+    def grava_lote(lote):
+        if any(item["valor"] is None for item in lote):
+            raise ValueError("valor inválido para a coluna")
+        gravadas.extend(item["valor"] for item in lote)
+
+    spool = cria_spool(tmp_path, grava_lote)
+    spool.publica({"valor": None})
+    for valor in range(5):
+        spool.publica({"valor": valor})
+    spool.iniciar()
+    try:
+        status = espera_fila_vazia(spool)
+    finally:
+        spool.parar()
+    assert status["fila"] == 0
+    assert status["rejeitados"] == 1
+    assert gravadas == [0, 1, 2, 3, 4]
+
+
+def test_banco_fora_do_ar_mantem_o_lote_no_spool(tmp_path):
+    tentativas = []
+
+    def grava_lote(lote):
+        tentativas.append(len(lote))
+        raise ConnectionError("sem conexão")
+
+    spool = cria_spool(tmp_path, grava_lote)
+    for valor in range(3):
+        spool.publica({"valor": valor})
+    linhas = spool._conexao.execute("select seq, criado, dados from spool order by seq").fetchall()
+    assert not spool._grava(spool._conexao, 0, linhas)
+    status = spool.status()
+    assert status["fila"] == 3
+    assert status["rejeitados"] == 0
+    assert tentativas == [3]